@@ -0,0 +1,140 @@
+"""This module provides a threshold alerting engine for river levels,
+evaluated for every station of a StationTable at once.
+
+Each station has an alert state - the number of thresholds its relative
+water level has crossed. A station moves up a state as soon as its level
+reaches the next threshold, but only moves back down once its level falls
+'hysteresis' below that threshold, so levels hovering around a threshold
+do not cause a stream of alerts.
+"""
+
+import numpy as np
+
+
+class Transition:
+    """This class represents a change in alert state of one station"""
+
+    __slots__ = ("station_id", "name", "old_state", "new_state", "relative_level")
+
+    def __init__(self, station_id, name, old_state, new_state, relative_level):
+
+        self.station_id = station_id
+        self.name = name
+        self.old_state = old_state
+        self.new_state = new_state
+        self.relative_level = relative_level
+
+    def __repr__(self):
+        direction = "raised" if self.new_state > self.old_state else "lowered"
+        return "Alert {} for {} ({} -> {}), relative level {:.2f}".format(
+            direction, self.name, self.old_state, self.new_state, self.relative_level
+        )
+
+
+class ThresholdAlerter:
+    """This class evaluates relative water level thresholds with hysteresis
+    for a StationTable, and keeps a ranking of the most at risk stations.
+
+    'thresholds' are relative water levels (see
+    StationTable.relative_water_level) in increasing order, e.g. the default
+    (1.0, 1.5, 2.0) gives state 1 at the typical high, and states 2 and 3 at
+    1.5 and 2 times the typical range.
+    """
+
+    def __init__(self, thresholds=(1.0, 1.5, 2.0), hysteresis=0.05, top_n=10):
+
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        if np.any(np.diff(self.thresholds) <= 0):
+            raise ValueError("thresholds must be strictly increasing")
+
+        self.hysteresis = hysteresis
+        self.top_n = top_n
+
+        # per station state, and the relative levels they were derived from
+        self.state = None
+        self.relative_level = None
+        self.ranking = np.zeros(0, dtype=np.intp)
+
+    def reset(self, n):
+        """Clear all states for a table of n stations"""
+        self.state = np.zeros(n, dtype=np.intp)
+        self.relative_level = np.full(n, np.nan)
+        self.ranking = np.zeros(0, dtype=np.intp)
+
+    def evaluate(self, table, changed=None):
+        """Update alert states from the latest levels in 'table' and return
+        a list of Transition objects for stations whose state changed.
+
+        If 'changed' (indices of stations whose level changed, e.g. from
+        StationTable.update_levels) is given, only those stations are
+        re-evaluated.
+        """
+
+        if self.state is None or len(self.state) != len(table):
+            self.reset(len(table))
+            changed = None
+
+        if changed is None:
+            changed = np.arange(len(table))
+        else:
+            changed = np.asarray(changed, dtype=np.intp)
+        self.relative_level[changed] = table.relative_water_level(changed)
+
+        rel = self.relative_level[changed]
+        old = self.state[changed]
+
+        # state reached by the level, and highest state the level can hold
+        # (thresholds lowered by the hysteresis)
+        reached = np.searchsorted(self.thresholds, rel, side="right")
+        held = np.searchsorted(self.thresholds - self.hysteresis, rel, side="right")
+
+        # move up to 'reached', drop down to 'held', otherwise stay put
+        new = np.clip(old, reached, held)
+
+        # stations without a level keep their state
+        unknown = np.isnan(rel)
+        new[unknown] = old[unknown]
+
+        self.state[changed] = new
+        self.update_ranking()
+
+        moved = np.flatnonzero(new != old)
+        return [
+            Transition(
+                table.station_ids[changed[i]],
+                table.names[changed[i]],
+                int(old[i]),
+                int(new[i]),
+                float(rel[i]),
+            )
+            for i in moved
+        ]
+
+    def update_ranking(self):
+        """Update the indices of the top_n stations with the highest
+        relative water level, highest first
+        """
+        # NaN levels rank last
+        neg = np.where(np.isnan(self.relative_level), np.inf, -self.relative_level)
+
+        n = min(self.top_n, np.count_nonzero(~np.isnan(self.relative_level)))
+        if n < len(neg):
+            ix = np.argpartition(neg, n)[:n]
+        else:
+            ix = np.arange(len(neg))[:n]
+
+        self.ranking = ix[np.argsort(neg[ix], kind="stable")]
+
+    def at_risk(self, table):
+        """Return a list of (station_id, name, state, relative level) tuples
+        for the current top_n most at risk stations
+        """
+        return [
+            (
+                table.station_ids[i],
+                table.names[i],
+                int(self.state[i]),
+                float(self.relative_level[i]),
+            )
+            for i in self.ranking
+        ]
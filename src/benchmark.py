@@ -0,0 +1,241 @@
+"""This module provides a benchmark suite for the database builders,
+polygon loaders and station queries, run against synthetic payloads (see
+synthetic.py) so results do not depend on how many warnings are live.
+
+Run from the repository root with e.g.
+
+    python -m src.benchmark --scale storm --save-baseline
+
+Each benchmark is timed (best of 'repeat' runs) and memory profiled (peak
+traced allocation of one run). Results are compared against a saved
+baseline, and any benchmark slower than the baseline by more than the
+tolerance is reported as a regression.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from unittest import mock
+import numpy as np
+
+from . import synthetic
+from . import floodwarningdata
+from . import stationdata
+from . import polygons
+from . import geometry
+
+sub_dir = "benchmarks"
+
+baseline_file = os.path.join(sub_dir, "baseline.json")
+
+# number of warnings and stations for each named scale
+scales = {
+    "quiet": {"warnings": 10, "stations": 5000},
+    "busy": {"warnings": 1000, "stations": 5000},
+    "storm": {"warnings": 20000, "stations": 50000},
+}
+
+
+def make_payloads(warnings, stations, seed=0):
+    """Generate synthetic payloads for 'warnings' warnings (split between
+    England, Wales and Scotland roughly as in real events) and 'stations'
+    monitoring stations
+    """
+    n_nrw = max(1, warnings // 10)
+    n_sepa = max(1, warnings // 10)
+    n_ea = max(1, warnings - n_nrw - n_sepa)
+
+    station_data = synthetic.station_payload(stations, seed)
+
+    return {
+        "n_ea": n_ea,
+        "n_nrw": n_nrw,
+        "ea": synthetic.ea_flood_payload(n_ea, seed),
+        "nrw": synthetic.nrw_flood_payload(n_nrw, seed),
+        "sepa": synthetic.sepa_payload(n_sepa, seed=seed),
+        "stations": station_data,
+        "levels": synthetic.water_level_payload(station_data, seed),
+    }
+
+
+def patched_fetchers(payloads):
+    """Return a list of patches replacing the data fetchers used by the
+    builders with ones returning the synthetic payloads
+    """
+    return [
+        mock.patch.object(floodwarningdata, "fetch_flood_data", lambda **kw: payloads["ea"]),
+        mock.patch.object(floodwarningdata, "fetch_wales_data", lambda **kw: payloads["nrw"]),
+        mock.patch.object(floodwarningdata, "fetch_scotland_data", lambda: payloads["sepa"]),
+        mock.patch.object(
+            stationdata, "fetch_station_data", lambda *a, **kw: payloads["stations"]
+        ),
+        mock.patch.object(
+            stationdata, "fetch_latest_water_level_data", lambda *a, **kw: payloads["levels"]
+        ),
+    ]
+
+
+def benchmarks(payloads, polygon_dir):
+    """Return a dictionary of benchmark name to a function with no
+    arguments which runs it
+    """
+
+    station_list = stationdata.build_station_list()
+    rng = np.random.default_rng(0)
+    points = list(
+        zip(rng.uniform(50.0, 55.5, 100), rng.uniform(-5.5, 1.7, 100))
+    )
+
+    def in_polygon_dir(f):
+        # the polygon loaders read shapefiles relative to the working directory
+        def run():
+            cwd = os.getcwd()
+            os.chdir(polygon_dir)
+            try:
+                return f()
+            finally:
+                os.chdir(cwd)
+
+        return run
+
+    def scotland():
+        # time the full parse rather than the cached result of an earlier run
+        geometry.prepared_cache.clear()
+        return floodwarningdata.build_scotland_geodataframe()
+
+    def nearest_stations():
+        for p in points:
+            stationdata.stations_by_distance(station_list, p)
+
+    return {
+        "build_flood_database": floodwarningdata.build_flood_database,
+        "build_scotland_geodataframe": scotland,
+        "build_station_database": stationdata.build_station_database,
+        "flood_warning_areas": in_polygon_dir(polygons.flood_warning_areas),
+        "flood_alert_areas": in_polygon_dir(polygons.flood_alert_areas),
+        "stations_by_distance": nearest_stations,
+    }
+
+
+def measure(f, repeat=3):
+    """Return (best time in seconds, peak traced memory in MB) for f"""
+
+    # memory profile one run (tracing slows execution, so is not timed)
+    tracemalloc.start()
+    f()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+
+    return min(times), peak / 1e6
+
+
+def run(warnings, stations, repeat=3, only=None, seed=0):
+    """Run the benchmarks against synthetic payloads of the given scale and
+    return a dictionary of benchmark name to {"time": s, "peak_mb": MB}
+    """
+
+    payloads = make_payloads(warnings, stations, seed)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as polygon_dir:
+        synthetic.write_polygon_data(
+            polygon_dir, payloads["n_ea"], payloads["n_nrw"], seed=seed
+        )
+
+        patches = patched_fetchers(payloads)
+        for p in patches:
+            p.start()
+        try:
+            for name, f in benchmarks(payloads, polygon_dir).items():
+                if only and name not in only:
+                    continue
+                t, peak = measure(f, repeat)
+                results[name] = {"time": t, "peak_mb": peak}
+                print("{:<30} {:>10.3f} s {:>10.1f} MB".format(name, t, peak))
+        finally:
+            for p in patches:
+                p.stop()
+
+    return results
+
+
+def load_baseline():
+    """Load saved baseline results, {scale: {benchmark: result}}"""
+    try:
+        with open(baseline_file, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(scale, results):
+    """Save results as the baseline for a scale"""
+    baseline = load_baseline()
+    baseline[scale] = results
+
+    os.makedirs(sub_dir, exist_ok=True)
+    with open(baseline_file, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def regressions(results, baseline, tolerance=0.25):
+    """Return a list of (benchmark, metric, baseline, result) for results
+    worse than the baseline by more than 'tolerance' (a fraction)
+    """
+    worse = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ["time", "peak_mb"]:
+            if result[metric] > baseline[name][metric] * (1 + tolerance):
+                worse.append((name, metric, baseline[name][metric], result[metric]))
+
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--scale", choices=sorted(scales), default="quiet")
+    parser.add_argument("--warnings", type=int, help="override number of warnings")
+    parser.add_argument("--stations", type=int, help="override number of stations")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--only", nargs="+", help="benchmarks to run")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    warnings = args.warnings or scales[args.scale]["warnings"]
+    stations = args.stations or scales[args.scale]["stations"]
+
+    # custom sizes are stored separately from the named scales
+    scale = args.scale
+    if args.warnings or args.stations:
+        scale = "{}w-{}s".format(warnings, stations)
+
+    print("Benchmark scale {}: {} warnings, {} stations".format(scale, warnings, stations))
+    results = run(warnings, stations, args.repeat, args.only)
+
+    if args.save_baseline:
+        save_baseline(scale, results)
+        print("Saved baseline to {}".format(baseline_file))
+        return 0
+
+    worse = regressions(results, load_baseline().get(scale, {}), args.tolerance)
+    for name, metric, before, after in worse:
+        print("REGRESSION {} {}: {:.3f} -> {:.3f}".format(name, metric, before, after))
+
+    return 1 if worse else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
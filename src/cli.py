@@ -0,0 +1,173 @@
+"""This module provides the command line interface, run with
+
+    python -m src <command> [options]
+
+Commands:
+    check   - check whether any EA flood warnings are active
+    fetch   - fetch the latest flood warning and station data into the cache
+    build   - build the flood warning database and write it to csv
+    poll    - rebuild the flood warning database every interval
+    export  - write the map and/or vector tiles for the active warnings
+    serve   - run the local query service (see server.py)
+
+Heavy dependencies (pandas, geopandas, shapely, numpy) are imported inside
+the commands that need them, so quick commands such as 'check' start fast.
+"""
+
+import sys
+import argparse
+
+
+def check(args):
+    """Exit status 0 if there are active warnings, 1 if there are none and
+    3 if the EA could not be reached or sent an invalid response
+    """
+    import requests
+    from .datafetcher import ea_monitoring
+
+    try:
+        active = ea_monitoring(severity=args.severity)
+    except (requests.RequestException, ValueError, KeyError) as e:
+        print("Could not check flood warnings: {}".format(e), file=sys.stderr)
+        return 3
+
+    print("Active flood warnings" if active else "No active flood warnings")
+
+    return 0 if active else 1
+
+
+def fetch(args):
+    from .datafetcher import fetch_flood_data, fetch_wales_data
+    from .datafetcher import fetch_station_data, fetch_latest_water_level_data
+
+    fetch_flood_data(severity=args.severity)
+    fetch_wales_data(severity=args.severity)
+    if args.stations:
+        fetch_station_data(use_cache=False)
+        fetch_latest_water_level_data()
+
+    return 0
+
+
+def build(args):
+    from .floodwarningdata import build_flood_database
+
+    db = build_flood_database(use_cache=args.use_cache)
+    db.to_csv(args.output)
+    print("Wrote {} flood warnings to {}".format(len(db), args.output))
+
+    return 0
+
+
+def poll(args):
+    from .floodwarningdata import update_flood_database
+
+    update_flood_database(dt=args.interval, sub_dir=args.output_dir)
+
+    return 0
+
+
+def export(args):
+    from .floodwarningdata import build_flood_database
+    from .polygons import prepared_flood_warning_areas
+
+    warnings = build_flood_database(use_cache=args.use_cache)
+
+    # areas are cached already projected for the map and the tiles
+    if args.map:
+        from .mapping import build_map, map_crs, map_exists, map_filename
+
+        # an unchanged set of warnings has already been mapped, so don't
+        # pay for loading the areas
+        if map_exists(warnings):
+            html_file = map_filename(warnings)
+        else:
+            fwas = prepared_flood_warning_areas(crs=map_crs)
+            html_file = build_map(warnings, fwas)
+        print("Map: {}".format(html_file))
+
+    if args.tiles:
+        from .tiles import export_tiles, tile_crs
+
+        fwas = prepared_flood_warning_areas(crs=tile_crs)
+        filename, written = export_tiles(warnings, fwas, full=args.full)
+        print("Tiles: {} ({} tiles written)".format(filename, written))
+
+    return 0
+
+
+def serve(args):
+    from .server import serve
+
+    serve(host=args.host, port=args.port)
+
+    return 0
+
+
+def parser():
+    """Return the argument parser for the command line interface"""
+
+    p = argparse.ArgumentParser(
+        prog="python -m src", description="Active flood warnings in GB"
+    )
+    p.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="write a Prometheus text snapshot of pipeline metrics to FILE",
+    )
+    sub = p.add_subparsers(dest="command", required=True)
+
+    c = sub.add_parser(
+        "check",
+        help="check for active warnings (exit status 0 if any, 1 if none, 3 on error)",
+    )
+    c.add_argument("--severity", type=int, default=2)
+    c.set_defaults(func=check)
+
+    c = sub.add_parser("fetch", help="fetch the latest data into the cache")
+    c.add_argument("--severity", type=int, default=2)
+    c.add_argument("--stations", action="store_true", help="also fetch stations and levels")
+    c.set_defaults(func=fetch)
+
+    c = sub.add_parser("build", help="build the flood warning database")
+    c.add_argument("--output", default="flood_database.csv")
+    c.add_argument("--use-cache", action="store_true")
+    c.set_defaults(func=build)
+
+    c = sub.add_parser("poll", help="rebuild the flood warning database periodically")
+    c.add_argument("--interval", type=float, default=15.0 * 60.0, help="seconds")
+    c.add_argument("--output-dir", default=".", help="directory for the csv files")
+    c.set_defaults(func=poll)
+
+    c = sub.add_parser("export", help="write the map and/or vector tiles")
+    c.add_argument("--map", action="store_true")
+    c.add_argument("--tiles", action="store_true")
+    c.add_argument("--full", action="store_true", help="regenerate all tiles")
+    c.add_argument("--use-cache", action="store_true")
+    c.set_defaults(func=export)
+
+    c = sub.add_parser("serve", help="run the local query service")
+    c.add_argument("--host", default="127.0.0.1")
+    c.add_argument("--port", type=int, default=8765)
+    c.set_defaults(func=serve)
+
+    return p
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+
+    if args.command == "export" and not (args.map or args.tiles):
+        args.map = True
+
+    try:
+        return args.func(args)
+    finally:
+        if args.metrics:
+            from .instrument import export_prometheus
+
+            export_prometheus(args.metrics)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
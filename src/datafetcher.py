@@ -4,8 +4,7 @@ latest flood warning data"""
 import os
 import json
 import requests
-from bs4 import BeautifulSoup
-from dotenv import load_dotenv
+from .instrument import span, count
 
 NRW_API_key = os.environ.get('nrw_key')
 
@@ -13,21 +12,47 @@ sub_dir = "cache"
 
 def fetch(url, headers={}):
     """Fetch data from url and return fetched JSON object"""
-    r = requests.get(url, headers=headers)
-    data = r.json()
+    with span("fetch", url=url.split("?")[0]) as s:
+        r = requests.get(url, headers=headers)
+        s.add(bytes=len(r.content))
+
+    with span("decode") as s:
+        data = r.json()
+        s.add(bytes=len(r.content))
+
     return data
 
 
 def dump(data, filename):
     """Save JSON object to file"""
-    f = open(filename, "w")
-    data = json.dump(data, f)
+    with span("dump", filename=filename):
+        with open(filename, "w") as f:
+            json.dump(data, f)
 
 
 def load(filename):
     """Load JSON object from file"""
-    f = open(filename, "r")
-    data = json.load(f)
+    with span("load", filename=filename) as s:
+        with open(filename, "r") as f:
+            data = json.load(f)
+            s.add(bytes=f.tell())
+    return data
+
+
+def load_or_fetch(cache_file, url, headers={}):
+    """Load JSON object from cache_file if possible, otherwise fetch it
+    from url and dump it to cache_file
+    """
+    try:
+        # Attempt to load from file
+        data = load(cache_file)
+        count("cache_hit")
+    except (OSError, ValueError):
+        # If load from file fails (missing or corrupt), fetch and dump to file
+        count("cache_miss")
+        data = fetch(url, headers=headers)
+        dump(data, cache_file)
+
     return data
 
 
@@ -50,22 +75,13 @@ def fetch_flood_data(severity=2, use_cache=False):
         root_url=root_url, severity=severity
     )
 
-    try:
-        os.makedirs(sub_dir)
-    except:
-        pass
+    os.makedirs(sub_dir, exist_ok=True)
     cache_file = os.path.join(sub_dir, "flood_warning_data.json")
 
     # Attempt to load station data from cache file, otherwise fetch over
     # Internet
     if use_cache:
-        try:
-            # Attempt to load from file
-            data = load(cache_file)
-        except:
-            # If load from file fails, fetch and dump to file
-            data = fetch(url)
-            dump(data, cache_file)
+        data = load_or_fetch(cache_file, url)
     else:
         # Fetch and dump to file
         data = fetch(url)
@@ -85,13 +101,7 @@ def fetch_wales_data(severity=2, use_cache=False):
     # Attempt to load station data from cache file, otherwise fetch over
     # Internet
     if use_cache:
-        try:
-            # Attempt to load from file
-            data = load(cache_file)
-        except:
-            # If load from file fails, fetch and dump to file
-            data = fetch(url, headers=headers)
-            dump(data, cache_file)
+        data = load_or_fetch(cache_file, url, headers=headers)
     else:
         # Fetch and dump to file
         data_json = fetch(url, headers=headers)
@@ -107,6 +117,8 @@ def fetch_wales_data(severity=2, use_cache=False):
 
 
 def fetch_scotland_data():
+    # only needed for scraping SEPA, so imported here to keep startup fast
+    from bs4 import BeautifulSoup
 
     url = "https://floodline.sepa.org.uk/floodupdates/#tabset-tab-2"
     #r = requests.get(url, proxies=proxy_dict)
@@ -156,20 +168,13 @@ def fetch_station_data(use_cache=True):
         + "id/stations?status=Active&parameter=level&qualifier=Stage&_view=full"
     )
 
-    try:
-        os.makedirs(sub_dir)
-    except:
-        pass
+    os.makedirs(sub_dir, exist_ok=True)
 
     cache_file = os.path.join(sub_dir, "station_data.json")
 
     # attempt to read data from file, otherwise fetch from URL
     if use_cache:
-        try:
-            data = load(cache_file)
-        except:
-            data = fetch(url)
-            dump(data, cache_file)
+        data = load_or_fetch(cache_file, url)
 
     else:
         data = fetch(url)
@@ -184,22 +189,44 @@ def fetch_latest_water_level_data(use_cache=False):
     # URL for retrieving data
     url = "http://environment.data.gov.uk/flood-monitoring/id/measures?parameter=level&qualifier=Stage&qualifier=level"
 
-    try:
-        os.makedirs(sub_dir)
-    except:
-        pass
+    os.makedirs(sub_dir, exist_ok=True)
     cache_file = os.path.join(sub_dir, "waterlevel_data.json")
 
     # Attempt to load level data from file, otherwise fetch from EA API
     if use_cache:
-        try:
-            # Attempt to load from file
-            data = load(cache_file)
-        except:
-            data = fetch(url)
-            dump(data, cache_file)
+        data = load_or_fetch(cache_file, url)
     else:
         data = fetch(url)
         dump(data, cache_file)
 
     return data
+
+
+def fetch_water_level_readings_since(since, limit=10000):
+    """Fetch all level readings taken since 'since' (an ISO 8601 date-time
+    string, e.g. '2024-07-12T10:30:00Z'). Returns a list of readings, each a
+    dict with 'measure', 'dateTime' and 'value' keys.
+
+    Unlike fetch_latest_water_level_data this only returns readings that
+    are new, so is much smaller when polled regularly. Results are not
+    cached since they depend on 'since'.
+    """
+
+    root_url = "http://environment.data.gov.uk/flood-monitoring/"
+    url = (
+        root_url
+        + "data/readings?parameter=level&since={since}&_sorted&_limit={limit}&_offset={offset}"
+    )
+
+    # the API returns at most 'limit' readings per request, so page
+    # through until a short page is returned
+    readings = []
+    offset = 0
+    while True:
+        data = fetch(url.format(since=since, limit=limit, offset=offset))
+        readings.extend(data["items"])
+        if len(data["items"]) < limit:
+            break
+        offset += limit
+
+    return readings
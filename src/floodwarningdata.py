@@ -6,6 +6,8 @@ from .floodwarning import FloodWarning
 from .datafetcher import fetch_flood_data, fetch_wales_data, fetch_scotland_data
 from .stationdata import build_station_database, update_water_levels
 from .stationdata import build_station_list, stations_by_river
+from .instrument import span, count, timed
+from .geometry import prepare_geometries, cached, data_version
 import pandas as pd
 from geopandas import GeoDataFrame
 from shapely.geometry import Polygon
@@ -19,6 +21,7 @@ import os
 severity = 2
 
 
+@timed("build_flood_list")
 def build_flood_list(use_cache=False):
     """Build a list of all flood events above a specified severity"""
 
@@ -50,9 +53,10 @@ def build_flood_list(use_cache=False):
 
             flood_warnings.append(f)
 
-        except:
+        except (KeyError, TypeError):
             # Not all required data on the flood warning was available, so
             # skip
+            count("skipped_warning")
             print(
                 "Not all of the data was available for flood {}".format(
                     e["description"]
@@ -63,6 +67,7 @@ def build_flood_list(use_cache=False):
     return flood_warnings
 
 
+@timed("build_flood_database")
 def build_flood_database(use_cache=False):
     """Build a dataframe containing all flood events above the
     specified severity
@@ -151,11 +156,27 @@ def build_flood_database(use_cache=False):
     return db
 
 
+@timed("build_scotland_geodataframe")
 def build_scotland_geodataframe():
+    """Build a geodataframe of SEPA flood warnings and their areas, with
+    geometries repaired and prepared (see geometry.py). Parsing and
+    preparation are skipped if the SEPA data is unchanged since last call.
+    """
 
     # fetch scotland data
     data = fetch_scotland_data()
     sepa_areas = data["floodwarningMap"]["areas"]
+
+    return cached(
+        "scotland",
+        data_version(sepa_areas),
+        lambda: scotland_geodataframe(sepa_areas),
+    )
+
+
+def scotland_geodataframe(sepa_areas):
+    """Build a prepared geodataframe of warnings from SEPA area data"""
+
     # convert to geodataframe
     sepa_df = GeoDataFrame(sepa_areas)
 
@@ -186,18 +207,18 @@ def build_scotland_geodataframe():
     sepa_df["description"] = tmp.name
     sepa_df["area_name"] = tmp.name
     sepa_df["severity"] = 2
-    sepa_df["geometry"] = tmp.geometry
-    sepa_df = sepa_df.set_geometry("geometry")
+    sepa_df = sepa_df.set_geometry(tmp.geometry)
 
-    return sepa_df
+    # SEPA coordinates are British National Grid
+    return prepare_geometries(sepa_df, source_crs="EPSG:27700")
 
 
-def update_flood_database(dt=15.0 * 60.0):
+def update_flood_database(dt=15.0 * 60.0, sub_dir="/data/Geospatial/BenMcdermott/surge"):
     """Updates the flood warning database every dt seconds
     --> 15 minutes = 15*60 seconds (default argument)
 
-    The database is saved as a csv file and overwritten every
-    dt seconds.
+    The database is saved as a csv file in the directory sub_dir, and
+    appended to every dt seconds.
     """
 
     # start time
@@ -205,7 +226,7 @@ def update_flood_database(dt=15.0 * 60.0):
     datetime_string = str(datetime.now().strftime("%Y-%m-%d-%H-%M-%S"))
 
     # path and csv file name
-    sub_dir = "/data/Geospatial/BenMcdermott/surge"
+    os.makedirs(sub_dir, exist_ok=True)
     filename = "flood_database" + datetime_string + ".csv"
     csv_file = os.path.join(sub_dir, filename)
 
@@ -218,7 +239,9 @@ def update_flood_database(dt=15.0 * 60.0):
     # db['stations_on_rivers'] = stations_on_rivers
 
     # write to file
-    db.to_csv(csv_file)
+    with span("write_csv", filename=csv_file) as s:
+        db.to_csv(csv_file)
+        s.add(items=len(db))
 
     # infinite loop that waits dt seconds before next execution
     while True:
@@ -235,7 +258,9 @@ def update_flood_database(dt=15.0 * 60.0):
         # db['stations_on_rivers'] = stations_on_rivers
 
         # append csv file specifying mode 'a' and no header
-        db.to_csv(csv_file, mode="a", header=False)
+        with span("write_csv", filename=csv_file) as s:
+            db.to_csv(csv_file, mode="a", header=False)
+            s.add(items=len(db))
 
 
 def datetime_from_string(datetime_string):
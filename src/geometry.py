@@ -0,0 +1,103 @@
+"""This module provides a preparation stage for flood area polygons, run
+once per version of the source data before the polygons are used in joins,
+buffers and repeated spatial predicates.
+
+Preparation:
+    * assigns a common CRS (British National Grid by default)
+    * repairs invalid geometries (e.g. self-intersecting rings)
+    * orients polygon rings consistently (exterior counter-clockwise)
+    * builds shapely's prepared structures, so repeated intersects/contains
+      calls don't rebuild them
+
+Prepared results are cached by source name and version, so later polls
+reuse them until the source data changes.
+"""
+
+import os
+import hashlib
+import json
+import shapely
+
+# CRS all flood area polygons are converted to
+common_crs = "EPSG:27700"
+
+# prepared GeoDataFrames, {name: (version, gdf)}
+prepared_cache = {}
+
+
+def repair(geoms):
+    """Return an array of geometries with invalid ones made valid, keeping
+    only their polygonal parts. Valid geometries are returned unchanged.
+    """
+    geoms = geoms.copy()
+    invalid = ~shapely.is_valid(geoms)
+    if invalid.any():
+        # the 'structure' method keeps polygons polygonal rather than
+        # returning collections of lines and points
+        geoms[invalid] = shapely.make_valid(
+            geoms[invalid], method="structure", keep_collapsed=False
+        )
+
+    return geoms
+
+
+def prepare_geometries(gdf, crs=common_crs, source_crs=None):
+    """Return a copy of a GeoDataFrame of polygons in 'crs', with invalid
+    geometries repaired, rings oriented and geometries prepared.
+
+    'source_crs' is assumed if gdf has no CRS set.
+    """
+    gdf = gdf.copy()
+    if gdf.crs is None:
+        gdf = gdf.set_crs(source_crs or crs)
+    if gdf.crs != crs:
+        gdf = gdf.to_crs(crs)
+
+    # drop missing geometries, which can't take part in any predicate
+    gdf = gdf[~gdf.geometry.isna()]
+
+    geoms = repair(gdf.geometry.values.to_numpy())
+    geoms = shapely.orient_polygons(geoms, exterior_cw=False)
+    shapely.prepare(geoms)
+
+    gdf[gdf.geometry.name] = geoms
+    gdf = gdf.set_crs(crs, allow_override=True)
+
+    return gdf
+
+
+def file_version(*paths):
+    """Return a version string for source files, from their sizes and
+    modification times
+    """
+    parts = []
+    for path in paths:
+        st = os.stat(path)
+        parts.append("{}:{}:{}".format(path, st.st_size, st.st_mtime_ns))
+
+    return "|".join(parts)
+
+
+def data_version(data):
+    """Return a version string for JSON-like source data (e.g. a fetched
+    payload), from a hash of its contents
+    """
+    h = hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8"))
+
+    return h.hexdigest()[:16]
+
+
+def cached(name, version, build):
+    """Return the prepared GeoDataFrame cached for source 'name' at
+    'version', calling build() to create it if there is none. Only the
+    latest version of each source is kept.
+
+    A copy is returned so callers can modify it freely; the geometries
+    themselves (and their prepared structures) are shared.
+    """
+    entry = prepared_cache.get(name)
+    if entry is None or entry[0] != version:
+        entry = (version, build())
+        prepared_cache[name] = entry
+
+    return entry[1].copy()
@@ -0,0 +1,250 @@
+"""This module provides lightweight instrumentation for the data pipeline:
+nested timing spans with byte and item counts, and named counters (e.g.
+cache hits and misses, skipped records).
+
+Instrumentation is on by default and costs a few microseconds per span.
+Switch it off with disable(), or by setting the environment variable
+GB_FLOODING_INSTRUMENT=0, in which case spans and counters do nothing.
+
+Usage:
+
+    with span("fetch", url=url) as s:
+        r = requests.get(url)
+        s.add(bytes=len(r.content))
+    count("cache_hit")
+
+    @timed("build_flood_database")
+    def build_flood_database(...):
+
+Finished spans can be written out as JSON lines with export_jsonl, and
+totals as a Prometheus text file with export_prometheus.
+"""
+
+import os
+import json
+import time
+import functools
+import threading
+from collections import deque, defaultdict
+
+enabled = os.environ.get("GB_FLOODING_INSTRUMENT", "1") != "0"
+
+# most recent finished spans, kept for export as JSON lines
+records = deque(maxlen=10000)
+
+# running totals per span name: count, seconds, bytes, items
+totals = defaultdict(lambda: {"count": 0, "seconds": 0.0, "bytes": 0, "items": 0})
+
+# named counters, e.g. cache_hit, cache_miss, skipped
+counters = defaultdict(int)
+
+lock = threading.Lock()
+local = threading.local()
+
+
+def enable():
+    """Switch instrumentation on"""
+    global enabled
+    enabled = True
+
+
+def disable():
+    """Switch instrumentation off"""
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Clear all recorded spans, totals and counters"""
+    with lock:
+        records.clear()
+        totals.clear()
+        counters.clear()
+
+
+class Span:
+    """This class represents one timed stage of the pipeline. Spans opened
+    inside another span are recorded with the parent's path as a prefix,
+    e.g. 'build_flood_database/fetch'.
+    """
+
+    __slots__ = (
+        "name", "path", "attrs", "bytes", "items", "start", "seconds", "error",
+        "child_exc",
+    )
+
+    def __init__(self, name, attrs):
+
+        self.name = name
+        self.attrs = attrs
+        self.bytes = 0
+        self.items = 0
+        self.error = None
+
+        # exception last raised out of a child span, already counted there
+        self.child_exc = None
+
+    def add(self, bytes=0, items=0):
+        """Add to the byte and item counts of this span"""
+        self.bytes += bytes
+        self.items += items
+
+    def __enter__(self):
+        stack = getattr(local, "stack", None)
+        if stack is None:
+            stack = local.stack = []
+
+        self.path = stack[-1].path + "/" + self.name if stack else self.name
+        stack.append(self)
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        local.stack.pop()
+
+        # count an error only in the span it was raised in, not again in
+        # every span it passes through
+        new_error = False
+        if exc_type is not None:
+            self.error = exc_type.__name__
+            new_error = exc is not self.child_exc
+            if local.stack:
+                local.stack[-1].child_exc = exc
+
+        record = {
+            "span": self.path,
+            "time": time.time(),
+            "seconds": self.seconds,
+            "bytes": self.bytes,
+            "items": self.items,
+        }
+        if self.error:
+            record["error"] = self.error
+        record.update(self.attrs)
+
+        with lock:
+            records.append(record)
+            t = totals[self.path]
+            t["count"] += 1
+            t["seconds"] += self.seconds
+            t["bytes"] += self.bytes
+            t["items"] += self.items
+            if new_error:
+                counters["error"] += 1
+
+        return False
+
+
+class NullSpan:
+    """A span that records nothing, used when instrumentation is disabled"""
+
+    __slots__ = ()
+
+    def add(self, bytes=0, items=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+null_span = NullSpan()
+
+
+def span(name, **attrs):
+    """Return a context manager timing a stage called 'name'. Keyword
+    arguments are stored with the exported record.
+    """
+    if not enabled:
+        return null_span
+
+    return Span(name, attrs)
+
+
+def timed(name, items=None):
+    """Decorator recording each call of a function as a span called 'name'.
+    'items' is a function of the result giving the span's item count; by
+    default lists and data frames are counted by their length.
+    """
+
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with span(name) as s:
+                result = f(*args, **kwargs)
+                if items is not None:
+                    s.add(items=items(result))
+                elif isinstance(result, list) or hasattr(result, "columns"):
+                    s.add(items=len(result))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, n=1):
+    """Increase the counter 'name' by n"""
+    if not enabled:
+        return
+
+    with lock:
+        counters[name] += n
+
+
+def export_jsonl(filename):
+    """Append finished spans to 'filename' as JSON lines, and clear them"""
+    with lock:
+        lines = [json.dumps(r, default=str) for r in records]
+        records.clear()
+
+    with open(filename, "a") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+def prometheus_text():
+    """Return span totals and counters in the Prometheus text format"""
+    with lock:
+        span_totals = {k: dict(v) for k, v in totals.items()}
+        counter_values = dict(counters)
+
+    metrics = [
+        ("count", "gb_flooding_span_total", "counter", "Number of times a stage ran"),
+        ("seconds", "gb_flooding_span_seconds_total", "counter", "Time spent in a stage"),
+        ("bytes", "gb_flooding_span_bytes_total", "counter", "Bytes processed by a stage"),
+        ("items", "gb_flooding_span_items_total", "counter", "Items processed by a stage"),
+    ]
+
+    lines = []
+    for key, metric, kind, description in metrics:
+        lines.append("# HELP {} {}".format(metric, description))
+        lines.append("# TYPE {} {}".format(metric, kind))
+        for path in sorted(span_totals):
+            lines.append(
+                '{}{{span="{}"}} {}'.format(metric, path, span_totals[path][key])
+            )
+
+    lines.append("# HELP gb_flooding_events_total Pipeline event counters")
+    lines.append("# TYPE gb_flooding_events_total counter")
+    for name in sorted(counter_values):
+        lines.append(
+            'gb_flooding_events_total{{event="{}"}} {}'.format(name, counter_values[name])
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+def export_prometheus(filename):
+    """Write a snapshot of span totals and counters to 'filename' in the
+    Prometheus text format (e.g. for the node exporter textfile collector).
+    The file is replaced atomically so it is never read half written.
+    """
+    tmp_file = filename + ".tmp"
+    with open(tmp_file, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_file, filename)
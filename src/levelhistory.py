@@ -0,0 +1,198 @@
+"""This module provides an in-memory store of recent water level readings
+for every measure, with trend metrics computed for all stations at once.
+
+Each measure has a fixed-size ring buffer of (time, value) readings, so
+memory use is fixed by the number of measures and the buffer capacity no
+matter how long the store is fed.
+"""
+
+import numpy as np
+
+
+def to_epoch_seconds(times):
+    """Convert a list of EA ISO 8601 date-time strings (e.g.
+    '2024-07-12T10:30:00Z') to an array of seconds since the epoch
+    """
+    # numpy does not parse timezone designators, and EA times are all UTC
+    stripped = [t.rstrip("Z") for t in times]
+
+    return np.array(stripped, dtype="datetime64[s]").astype(np.float64)
+
+
+class LevelHistory:
+    """This class represents a history of the last 'capacity' level
+    readings for each of a fixed set of measures.
+
+    Readings are stored in (n_measures, capacity) arrays of times (seconds
+    since the epoch) and values, with NaN marking empty slots. Metrics
+    return one entry per measure, in the order of 'measure_ids'.
+    """
+
+    def __init__(self, measure_ids, capacity=96):
+
+        self.measure_ids = list(measure_ids)
+        self.measure_index = {m: i for i, m in enumerate(self.measure_ids)}
+        self.capacity = capacity
+
+        n = len(self.measure_ids)
+        self.times = np.full((n, capacity), np.nan)
+        self.values = np.full((n, capacity), np.nan)
+
+        # slot the next reading for each measure is written to
+        self.head = np.zeros(n, dtype=np.intp)
+
+    @classmethod
+    def from_stations(cls, stations, capacity=96):
+        """Build an empty history for the measures of a list of
+        MonitoringStation objects (or a StationTable)
+        """
+        if hasattr(stations, "measure_ids"):
+            return cls(stations.measure_ids, capacity)
+
+        return cls([s.measure_id for s in stations], capacity)
+
+    def __len__(self):
+        return len(self.measure_ids)
+
+    @property
+    def nbytes(self):
+        """Memory used by the reading buffers (in bytes)"""
+        return self.times.nbytes + self.values.nbytes + self.head.nbytes
+
+    def latest_times(self):
+        """Return the time of the newest reading for each measure"""
+        rows = np.arange(len(self))
+        return self.times[rows, (self.head - 1) % self.capacity]
+
+    def record(self, measure_ids, times, values):
+        """Add readings for the given measures. 'times' are EA date-time
+        strings or seconds since the epoch. A measure may have several
+        readings, in any order; they are stored in time order.
+
+        Unknown measures, non-numeric values and readings no newer than the
+        measure's latest stored reading are ignored, so overlapping refreshes
+        do not record the same reading twice. Returns the number recorded.
+        """
+
+        rows, t, v = [], [], []
+        for measure_id, time, value in zip(measure_ids, times, values):
+            i = self.measure_index.get(measure_id)
+            if i is not None and isinstance(value, float):
+                rows.append(i)
+                t.append(time)
+                v.append(value)
+
+        if not rows:
+            return 0
+
+        rows = np.asarray(rows, dtype=np.intp)
+        if isinstance(t[0], str):
+            t = to_epoch_seconds(t)
+        t = np.asarray(t, dtype=np.float64)
+        v = np.asarray(v, dtype=np.float64)
+
+        # drop readings already stored (NaN for empty buffers compares False)
+        stale = t <= self.latest_times()[rows]
+        rows, t, v = rows[~stale], t[~stale], v[~stale]
+        if not len(rows):
+            return 0
+
+        # sort by measure then time, and drop repeats of the same reading
+        order = np.lexsort((t, rows))
+        rows, t, v = rows[order], t[order], v[order]
+        repeat = (rows[1:] == rows[:-1]) & (t[1:] == t[:-1])
+        keep = np.append(~repeat, True)
+        rows, t, v = rows[keep], t[keep], v[keep]
+
+        # position of each reading among its measure's new readings
+        measures, first, counts = np.unique(rows, return_index=True, return_counts=True)
+        rank = np.arange(len(rows)) - np.repeat(first, counts)
+
+        # only the newest 'capacity' readings of a measure fit in its buffer
+        skip = np.repeat(np.maximum(counts - self.capacity, 0), counts)
+        fits = rank >= skip
+        rows, t, v = rows[fits], t[fits], v[fits]
+        rank = (rank - skip)[fits]
+
+        slots = (self.head[rows] + rank) % self.capacity
+        self.times[rows, slots] = t
+        self.values[rows, slots] = v
+        self.head[measures] = (
+            self.head[measures] + np.minimum(counts, self.capacity)
+        ) % self.capacity
+
+        return len(rows)
+
+    def chronological(self):
+        """Return (times, values) arrays with each row ordered from oldest
+        to newest reading. Empty slots (NaN) come first.
+        """
+        ix = (self.head[:, None] + np.arange(self.capacity)) % self.capacity
+
+        return (
+            np.take_along_axis(self.times, ix, axis=1),
+            np.take_along_axis(self.values, ix, axis=1),
+        )
+
+    def in_window(self, window, now=None):
+        """Return chronological (times, values, mask), where mask is True
+        for readings within 'window' seconds of 'now' (by default the time
+        of the newest reading of any measure)
+        """
+        times, values = self.chronological()
+        if now is None:
+            now = np.nanmax(self.times) if np.any(~np.isnan(self.times)) else 0.0
+
+        # comparisons with NaN are False, so empty slots are excluded
+        mask = (times >= now - window) & (times <= now)
+
+        return times, values, mask
+
+    def rate_of_rise(self, window=3600.0, now=None):
+        """Return the rate of change of level (units per hour) for each
+        measure, between the oldest and newest readings within the window.
+        NaN where there are fewer than two readings in the window.
+        """
+        times, values, mask = self.in_window(window, now)
+        rows = np.arange(len(self))
+
+        # index of the oldest and newest reading in the window
+        first = np.argmax(mask, axis=1)
+        last = self.capacity - 1 - np.argmax(mask[:, ::-1], axis=1)
+
+        dt = times[rows, last] - times[rows, first]
+        dv = values[rows, last] - values[rows, first]
+
+        rate = np.full(len(self), np.nan)
+        ok = mask.any(axis=1) & (dt > 0)
+        rate[ok] = dv[ok] / dt[ok] * 3600.0
+
+        return rate
+
+    def rolling_max(self, window=86400.0, now=None):
+        """Return the maximum level of each measure within the window, NaN
+        if there are no readings in the window
+        """
+        _, values, mask = self.in_window(window, now)
+        masked = np.where(mask, values, -np.inf)
+
+        result = masked.max(axis=1)
+        result[~mask.any(axis=1)] = np.nan
+
+        return result
+
+    def time_above(self, thresholds, window=86400.0, now=None):
+        """Return the time (in seconds) each measure has spent above its
+        threshold within the window (e.g. the typical high of a
+        StationTable). A reading is taken to hold until the next one, so
+        the newest reading does not contribute.
+        """
+        times, values, mask = self.in_window(window, now)
+        thresholds = np.asarray(thresholds, dtype=np.float64).reshape(-1, 1)
+
+        # durations between consecutive readings in the window
+        both = mask[:, :-1] & mask[:, 1:]
+        dt = np.diff(times, axis=1)
+        above = values[:, :-1] > thresholds
+
+        return np.where(both & above, dt, 0.0).sum(axis=1)
@@ -1,13 +1,46 @@
+"""This module provides functionality for rendering active flood warnings
+onto an interactive map
+"""
+
+import os
+import glob
+import hashlib
 import folium
 from folium.plugins import Fullscreen
 import geopandas
 
+from .utils import snapshot_hash
+from .polygons import flood_warning_areas_version
+
+sub_dir = "maps"
+
+# number of maps kept in sub_dir, older ones are removed
+keep_maps = 10
+
+# CRS of the map data (pass areas already in it to skip reprojecting)
+map_crs = "EPSG:4326"
+
+# columns that identify a snapshot of warnings - if none of these change
+# then the rendered map is identical and does not need to be rebuilt
+snapshot_cols = [
+    "FWS_TACODE",
+    "severity",
+    "message",
+    "time_message_changed",
+    "time_severity_changed",
+]
+
+# fill colour for each warning severity (1 = severe, 2 = warning)
+severity_colours = {1: "#d7191c", 2: "#fdae61", 3: "#ffffbf"}
+
+
 def generate_basemap():
+    """Return a folium map centred on the UK with a fullscreen button"""
     #location point
     centre_of_uk = (53.82, -2.41)
 
     # basemap
-    m = folium.map(
+    m = folium.Map(
         location = centre_of_uk,
         tiles = "OpenStreetMap",
         zoom_start = 7,
@@ -17,10 +50,16 @@ def generate_basemap():
 
     # add full screen button
     Fullscreen(
-        title="Expand me", title_cancel="Exit fullscreen", force_seperate_button=True 
-    )
+        title="Expand me", title_cancel="Exit fullscreen", force_separate_button=True
+    ).add_to(m)
+
+    return m
 
 def map_data(db):
+    """Returns a GeoDataFrame of the columns required for plotting, in
+    WGS84 and sorted by severity so the most severe warnings are drawn last
+    """
+    db = db.copy()
     db["geoid"] = db.index.astype(str)
     plot_cols = [
         "geoid",
@@ -28,7 +67,98 @@ def map_data(db):
         "severity",
         "description",
         "message",
-        "geom",
+        db.geometry.name,
     ]
 
-    data = db[plot_cols].sort_values(by=["severity"], ascending = True)
+    data = db[plot_cols].sort_values(by=["severity"], ascending = False)
+    if data.crs != map_crs:
+        data = data.to_crs(map_crs)
+
+    return data
+
+def map_filename(db, ext="html"):
+    """Returns the path of the map artefact for the current set of warnings.
+    The name is derived from a hash of the warnings and the version of the
+    flood warning area shapefiles, so it only changes when either does.
+    """
+    h = hashlib.sha256()
+    h.update(snapshot_hash(db, snapshot_cols).encode("utf-8"))
+    h.update(flood_warning_areas_version().encode("utf-8"))
+    filename = "flood_map_{}.{}".format(h.hexdigest()[:16], ext)
+
+    return os.path.join(sub_dir, filename)
+
+def map_exists(db):
+    """Return True if the map (and matching GeoJSON) for the current set of
+    warnings has already been built
+    """
+    return all(os.path.exists(map_filename(db, ext)) for ext in ["html", "geojson"])
+
+def prune_maps(keep=None):
+    """Remove all but the 'keep' (default keep_maps) most recently built
+    maps (and their GeoJSON) from sub_dir
+    """
+    if keep is None:
+        keep = keep_maps
+    html_files = sorted(
+        glob.glob(os.path.join(sub_dir, "flood_map_*.html")),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for html_file in html_files[keep:]:
+        for filename in [html_file, html_file[: -len("html")] + "geojson"]:
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+
+def build_map(warnings, fwas, force=False):
+    """Build a standalone HTML map (and matching GeoJSON) of the active flood
+    warnings, joined to their flood warning areas.
+
+    Maps are content-addressed by a hash of the warning set and the area
+    shapefiles, so if a map for the current warnings already exists it is
+    reused rather than re-rendered. Only the last 'keep_maps' maps are kept.
+    Returns the path of the HTML file.
+    """
+
+    html_file = map_filename(warnings, "html")
+    geojson_file = map_filename(warnings, "geojson")
+
+    if not force and map_exists(warnings):
+        return html_file
+
+    # join warnings to their polygons
+    active_fwas = fwas.merge(warnings, on="FWS_TACODE", how="inner")
+    data = map_data(active_fwas)
+    geojson = data.to_json()
+
+    # draw the warning areas on the basemap (on a quiet day there are
+    # none, and the map is just the basemap)
+    m = generate_basemap()
+    if len(data):
+        folium.GeoJson(
+            geojson,
+            name="Flood warnings",
+            style_function=lambda f: {
+                "fillColor": severity_colours.get(f["properties"]["severity"], "#2b83ba"),
+                "color": "black",
+                "weight": 1,
+                "fillOpacity": 0.6,
+            },
+            tooltip=folium.GeoJsonTooltip(fields=["FWS_TACODE", "severity", "description"]),
+        ).add_to(m)
+        folium.LayerControl().add_to(m)
+    html = m.get_root().render()
+
+    # only write the artefacts once rendering has succeeded, replacing
+    # them whole so a map is never left without its GeoJSON
+    os.makedirs(sub_dir, exist_ok=True)
+    for filename, content in [(geojson_file, geojson), (html_file, html)]:
+        with open(filename + ".tmp", "w") as f:
+            f.write(content)
+        os.replace(filename + ".tmp", filename)
+
+    prune_maps()
+
+    return html_file
@@ -1,6 +1,11 @@
 import pandas as pd
 import geopandas as gpd
+from pyproj import CRS
 
+from .instrument import timed
+from .geometry import prepare_geometries, cached, file_version, common_crs
+
+@timed("flood_alert_areas")
 def flood_alert_areas():
     """Function to build a gdf of flood warning areas (FWAs) from zipped shapefile"""
 
@@ -17,6 +22,7 @@ def flood_alert_areas():
 
     return db
 
+@timed("flood_warning_areas")
 def flood_warning_areas():
     """Function to build a gdf of flood warning areas (FWAs) from zipped shapefile"""
 
@@ -33,6 +39,43 @@ def flood_warning_areas():
 
     return db
 
+def prepared_areas(name, version, load, crs=common_crs):
+    """Return the areas built by load() with geometries repaired and
+    prepared in 'crs', cached by name, version and CRS. Frames in other
+    CRSs are reprojected once from the cached common CRS frame.
+    """
+    if CRS.from_user_input(crs) == CRS.from_user_input(common_crs):
+        return cached(name, version, lambda: prepare_geometries(load()))
+
+    key = "{} {}".format(name, CRS.from_user_input(crs).to_string())
+    return cached(
+        key,
+        version,
+        lambda: prepare_geometries(prepared_areas(name, version, load), crs),
+    )
+
+def prepared_flood_alert_areas(crs=common_crs):
+    """Function to return flood alert areas with geometries repaired and
+    prepared in 'crs' (see geometry.py). Cached until the shapefiles change.
+    """
+    version = file_version("data/Flood_Alert_Areas.zip", "data/NRW_FLOOD_ALERT.zip")
+
+    return prepared_areas("flood_alert_areas", version, flood_alert_areas, crs)
+
+def prepared_flood_warning_areas(crs=common_crs):
+    """Function to return flood warning areas with geometries repaired and
+    prepared in 'crs' (see geometry.py). Cached until the shapefiles change.
+    """
+    version = flood_warning_areas_version()
+
+    return prepared_areas("flood_warning_areas", version, flood_warning_areas, crs)
+
+def flood_warning_areas_version():
+    """Function to return a version string for the flood warning area
+    shapefiles, which changes when they are replaced
+    """
+    return file_version("data/Flood_Warning_Areas.zip", "data/NRW_FLOOD_WARNING.zip")
+
 # def flood_areas(): 
 #     "Returns a gdf containing all flood areas whether severity 2 or 3"
 #     # Dropped severity 3 (alerts) as not required 
@@ -0,0 +1,246 @@
+"""This module provides a long-running local query service which keeps the
+flood warning areas, active warnings and station table in memory, refreshes
+them in the background, and answers queries over HTTP on localhost.
+
+Responses are serialised once per refresh, so queries are answered from
+memory without rebuilding anything. Endpoints (all GET):
+
+    /health                      - snapshot version and refresh times
+    /warnings                    - active warnings with their areas, GeoJSON
+    /warnings?format=json        - active warnings without geometry, JSON
+    /stations                    - stations with latest and relative levels
+    /areas?code=A&code=B         - flood warning areas by code, GeoJSON
+    /nearest?lat=..&lon=..&k=5   - nearest stations to a point
+
+Run with 'python -m src serve'.
+"""
+
+import json
+import time
+import threading
+import traceback
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from .floodwarningdata import build_flood_database
+from .stationdata import build_station_list, refresh_water_levels
+from .station import StationTable
+from .stationindex import StationIndex
+from .polygons import prepared_flood_warning_areas
+from .utils import snapshot_hash
+from .mapping import snapshot_cols
+from .instrument import span, count
+
+
+class WarmState:
+    """This class holds the in-memory data served by the query service.
+
+    refresh_warnings and refresh_levels build new serialised responses and
+    then swap them in, so queries never see a half-updated state.
+    """
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+
+        # flood warning areas (static reference data) in WGS84, by code
+        with span("load_areas"):
+            fwas = prepared_flood_warning_areas(crs="EPSG:4326")
+        self.fwas = fwas
+        self.area_index = {code: i for i, code in enumerate(fwas.FWS_TACODE)}
+        self.area_cache = {}
+
+        # levels are attached by the first refresh_levels, which fetches
+        # all latest readings since 'since' is None
+        self.stations = build_station_list()
+        self.station_index = StationIndex.from_stations(self.stations)
+        self.since = None
+
+        self.responses = {}
+        self.version = None
+        self.warnings_time = None
+        self.levels_time = None
+
+        self.refresh_warnings()
+        self.refresh_levels()
+
+    def refresh_warnings(self):
+        """Rebuild the warnings responses if the set of warnings changed"""
+
+        warnings = build_flood_database()
+        version = snapshot_hash(warnings, snapshot_cols)
+        self.warnings_time = time.time()
+        if version == self.version:
+            return
+
+        with span("serialise_warnings"):
+            active = self.fwas.merge(warnings, on="FWS_TACODE", how="inner")
+            geojson = active.to_json(default=str).encode("utf-8")
+            records = warnings.to_json(orient="records", date_format="iso").encode("utf-8")
+
+        with self.lock:
+            self.responses["warnings"] = geojson
+            self.responses["warnings.json"] = records
+            self.version = version
+
+    def refresh_levels(self):
+        """Fetch new level readings and rebuild the stations response"""
+
+        changed, self.since = refresh_water_levels(self.stations, self.since)
+        self.levels_time = time.time()
+        if changed or "stations" not in self.responses:
+            with span("serialise_stations"):
+                table = StationTable.from_stations(self.stations)
+                rel = table.relative_water_level()
+                rows = [
+                    {
+                        "station_id": s.station_id,
+                        "name": s.name,
+                        "river": s.river,
+                        "town": s.town,
+                        "lat": s.coord[0],
+                        "lon": s.coord[1],
+                        "latest_level": s.latest_level,
+                        "relative_level": None if np.isnan(r) else float(r),
+                    }
+                    for s, r in zip(self.stations, rel)
+                ]
+                body = json.dumps(rows).encode("utf-8")
+
+            with self.lock:
+                self.responses["stations"] = body
+
+    def areas(self, codes):
+        """Return GeoJSON bytes for the flood warning areas with the given
+        codes (unknown codes are ignored)
+        """
+        key = tuple(sorted(codes))
+        body = self.area_cache.get(key)
+        if body is None:
+            count("area_cache_miss")
+            rows = [self.area_index[c] for c in key if c in self.area_index]
+            body = self.fwas.iloc[rows].to_json(default=str).encode("utf-8")
+            # only single-area results are worth keeping indefinitely
+            if len(key) == 1:
+                self.area_cache[key] = body
+        else:
+            count("area_cache_hit")
+
+        return body
+
+    def nearest(self, lat, lon, k):
+        """Return JSON bytes for the k nearest stations to (lat, lon)"""
+        d, ix = self.station_index.nearest([(lat, lon)], k)
+        rows = [
+            {
+                "station_id": self.stations[i].station_id,
+                "name": self.stations[i].name,
+                "distance_km": float(dist),
+                "latest_level": self.stations[i].latest_level,
+            }
+            for dist, i in zip(d[0], ix[0])
+            if i < len(self.stations)
+        ]
+
+        return json.dumps(rows).encode("utf-8")
+
+    def health(self):
+        return json.dumps(
+            {
+                "version": self.version,
+                "warnings_refreshed": self.warnings_time,
+                "levels_refreshed": self.levels_time,
+                "stations": len(self.stations),
+                "areas": len(self.fwas),
+            }
+        ).encode("utf-8")
+
+
+def refresh_loop(dt, refresh, stop):
+    """Call refresh() every dt seconds until 'stop' is set"""
+    starttime = time.time()
+    while not stop.wait(dt - ((time.time() - starttime) % dt)):
+        try:
+            refresh()
+        except Exception:
+            # keep serving the previous state if a refresh fails
+            count("refresh_error")
+            traceback.print_exc()
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Request handler answering queries from the server's WarmState"""
+
+    def do_GET(self):
+        state = self.server.state
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        content_type = "application/json"
+
+        try:
+            if url.path == "/health":
+                body = state.health()
+            elif url.path == "/warnings":
+                if query.get("format", ["geojson"])[0] == "json":
+                    body = state.responses["warnings.json"]
+                else:
+                    body = state.responses["warnings"]
+                    content_type = "application/geo+json"
+            elif url.path == "/stations":
+                body = state.responses["stations"]
+            elif url.path == "/areas":
+                body = state.areas(query.get("code", []))
+                content_type = "application/geo+json"
+            elif url.path == "/nearest":
+                body = state.nearest(
+                    float(query["lat"][0]),
+                    float(query["lon"][0]),
+                    int(query.get("k", ["5"])[0]),
+                )
+            else:
+                self.send_error(404)
+                return
+        except (KeyError, ValueError) as e:
+            self.send_error(400, "Bad query: {}".format(e))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # queries are frequent, so don't log each one
+        pass
+
+
+def serve(host="127.0.0.1", port=8765, warnings_dt=15.0 * 60.0, levels_dt=5.0 * 60.0):
+    """Load the warm state and serve queries until interrupted. Warnings
+    are refreshed every warnings_dt seconds and levels every levels_dt.
+    """
+
+    state = WarmState()
+
+    stop = threading.Event()
+    for dt, refresh in [
+        (warnings_dt, state.refresh_warnings),
+        (levels_dt, state.refresh_levels),
+    ]:
+        threading.Thread(
+            target=refresh_loop, args=(dt, refresh, stop), daemon=True
+        ).start()
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.state = state
+    print("Serving on http://{}:{}".format(host, port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
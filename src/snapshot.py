@@ -0,0 +1,298 @@
+"""This module builds a full GB snapshot - warnings, areas, stations and
+levels - by running the independent build steps in parallel on a process
+pool.
+
+The steps form a small dependency graph (see 'tasks'). Most steps with no
+dependencies run in worker processes. Large results (numeric arrays and
+geometries) come back through shared memory rather than being pickled:
+geometries are passed as one WKB buffer plus offsets, and numeric arrays
+as raw buffers. Steps which combine results run in the parent process once
+their inputs are ready, as do steps whose results are cached (see
+geometry.py) - a worker's cache is lost with the worker.
+"""
+
+import os
+import hashlib
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+import pandas as pd
+import shapely
+from geopandas import GeoDataFrame
+
+from .floodwarningdata import build_flood_database, build_scotland_geodataframe
+from .stationdata import build_station_list
+from .datafetcher import fetch_latest_water_level_data
+from .polygons import prepared_flood_warning_areas
+from .station import StationTable
+from .mapping import snapshot_cols
+from .utils import snapshot_hash
+from .instrument import span
+
+
+class SharedArray:
+    """This class represents a NumPy array copied into a shared memory
+    block, which can be sent between processes by name
+    """
+
+    def __init__(self, array):
+
+        array = np.ascontiguousarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+        self.name = shm.name
+
+        # the receiving process unlinks the block, so stop this process's
+        # resource tracker removing it when this process exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+        shm.close()
+
+    def release(self):
+        """Free the shared memory block without reading it"""
+        try:
+            shm = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+
+    def take(self):
+        """Copy the array out of shared memory, and free the block. Can
+        only be called once.
+        """
+        shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            return np.ndarray(self.shape, self.dtype, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+def to_shared(result):
+    """Convert a task result to a picklable form with large arrays and
+    geometries moved to shared memory
+    """
+    if isinstance(result, GeoDataFrame):
+        wkb = shapely.to_wkb(result.geometry.values.to_numpy())
+        lengths = np.array([len(b) for b in wkb], dtype=np.int64)
+        return (
+            "geo",
+            pd.DataFrame(result.drop(columns=result.geometry.name)),
+            result.geometry.name,
+            None if result.crs is None else result.crs.to_wkt(),
+            SharedArray(np.frombuffer(b"".join(wkb), dtype=np.uint8)),
+            SharedArray(lengths),
+        )
+
+    if isinstance(result, StationTable):
+        numeric = ["lat", "lon", "typical_low", "typical_high", "latest_level"]
+        return (
+            "stations",
+            {k: SharedArray(getattr(result, k)) for k in numeric},
+            {
+                k: getattr(result, k)
+                for k in ["station_ids", "measure_ids", "names", "rivers", "towns"]
+            },
+        )
+
+    return ("plain", result)
+
+
+def from_shared(payload):
+    """Rebuild a task result from the output of to_shared"""
+    kind = payload[0]
+
+    if kind == "geo":
+        _, frame, geometry_name, crs, wkb, lengths = payload
+        buffer = wkb.take().tobytes()
+        ends = np.cumsum(lengths.take())
+        starts = np.concatenate(([0], ends[:-1]))
+        geoms = shapely.from_wkb(
+            np.array([buffer[s:e] for s, e in zip(starts, ends)], dtype=object)
+        )
+
+        # prepared structures don't survive serialisation, so rebuild them
+        shapely.prepare(geoms)
+
+        frame[geometry_name] = geoms
+        return GeoDataFrame(frame, geometry=geometry_name, crs=crs)
+
+    if kind == "stations":
+        _, numeric, objects = payload
+        arrays = {k: v.take() for k, v in numeric.items()}
+        return StationTable(
+            station_ids=objects["station_ids"],
+            measure_ids=objects["measure_ids"],
+            names=objects["names"],
+            lat=arrays["lat"],
+            lon=arrays["lon"],
+            typical_low=arrays["typical_low"],
+            typical_high=arrays["typical_high"],
+            rivers=objects["rivers"],
+            towns=objects["towns"],
+            latest_level=arrays["latest_level"],
+        )
+
+    return payload[1]
+
+
+def release(payload):
+    """Free any shared memory held by the output of to_shared"""
+    for item in payload:
+        values = item.values() if isinstance(item, dict) else [item]
+        for v in values:
+            if isinstance(v, SharedArray):
+                v.release()
+
+
+def build_stations():
+    """Build a StationTable of stations (without levels)"""
+    return StationTable.from_stations(build_station_list())
+
+
+def fetch_levels():
+    """Return a dictionary of measure id to latest reading"""
+    data = fetch_latest_water_level_data()
+    return {
+        m["latestReading"]["measure"]: m["latestReading"]["value"]
+        for m in data["items"]
+        if "latestReading" in m
+    }
+
+
+def attach_levels(stations, levels):
+    """Attach latest readings to the StationTable"""
+    stations.update_levels(levels)
+    return stations
+
+
+def merge_areas(warnings, areas, scotland):
+    """Join England and Wales warnings to their areas, and add the
+    Scottish warning areas
+    """
+    active = areas.merge(warnings, on="FWS_TACODE", how="inner")
+    if len(scotland):
+        active = pd.concat([active, scotland.to_crs(active.crs)], ignore_index=True)
+
+    return GeoDataFrame(active, geometry=active.geometry.name, crs=areas.crs)
+
+
+# the snapshot dependency graph: name -> (function, dependencies, run in pool)
+tasks = {
+    "warnings": (build_flood_database, [], True),
+    "scotland": (build_scotland_geodataframe, [], False),
+    "areas": (prepared_flood_warning_areas, [], False),
+    "stations": (build_stations, [], True),
+    "levels": (fetch_levels, [], True),
+    "stations_with_levels": (attach_levels, ["stations", "levels"], False),
+    "active_areas": (merge_areas, ["warnings", "areas", "scotland"], False),
+}
+
+
+def run_task(name):
+    """Run a task in a worker process, returning its shared form"""
+    return to_shared(tasks[name][0]())
+
+
+class Snapshot:
+    """This class represents one consistent build of all GB data. 'version'
+    is a hash of the warnings and station levels it was built from, so two
+    snapshots with the same version hold the same data.
+    """
+
+    def __init__(self, warnings, scotland, areas, active_areas, stations, created):
+
+        self.warnings = warnings
+        self.scotland = scotland
+        self.areas = areas
+        self.active_areas = active_areas
+        self.stations = stations
+        self.created = created
+
+        h = hashlib.sha256()
+        h.update(snapshot_hash(warnings, snapshot_cols).encode("utf-8"))
+        h.update(snapshot_hash(scotland, ["FWS_TACODE", "severity"]).encode("utf-8"))
+        h.update(np.nan_to_num(stations.latest_level, nan=-1e9).tobytes())
+        self.version = h.hexdigest()[:16]
+
+    def __repr__(self):
+        d = "Snapshot version:     {}\n".format(self.version)
+        d += "         created:     {}\n".format(self.created)
+        d += "         warnings:    {} (+{} Scotland)\n".format(
+            len(self.warnings), len(self.scotland)
+        )
+        d += "         areas:       {} ({} active)\n".format(
+            len(self.areas), len(self.active_areas)
+        )
+        d += "         stations:    {}".format(len(self.stations))
+        return d
+
+
+def build_snapshot(max_workers=None):
+    """Build a Snapshot, running independent steps in parallel on a pool
+    of max_workers processes (default: one per pool task, up to one per
+    CPU)
+    """
+    if max_workers is None:
+        n_pool_tasks = sum(1 for _, _, in_pool in tasks.values() if in_pool)
+        max_workers = max(1, min(os.cpu_count() or 1, n_pool_tasks))
+
+    created = datetime.now()
+    results = {}
+
+    with span("build_snapshot"), ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending = {}
+        remaining = dict(tasks)
+
+        try:
+            while remaining or pending:
+                ready = [
+                    name
+                    for name, (f, deps, in_pool) in remaining.items()
+                    if all(d in results for d in deps)
+                ]
+
+                # start every pool task whose dependencies are done, then
+                # run the parent's tasks while the pool works
+                for name in sorted(ready, key=lambda n: not tasks[n][2]):
+                    f, deps, in_pool = remaining.pop(name)
+                    if in_pool:
+                        pending[pool.submit(run_task, name)] = name
+                    else:
+                        with span(name):
+                            results[name] = f(*[results[d] for d in deps])
+
+                if not pending:
+                    if remaining and not ready:
+                        raise ValueError(
+                            "Unsatisfiable task dependencies: {}".format(sorted(remaining))
+                        )
+                    continue
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending[future]
+                    with span("receive_" + name):
+                        results[name] = from_shared(future.result())
+                    del pending[future]
+        except BaseException:
+            # free shared memory of results that will never be read (a
+            # partly received result only frees what it has left)
+            for future in pending:
+                if not future.cancel() and future.exception() is None:
+                    release(future.result())
+            raise
+
+    return Snapshot(
+        warnings=results["warnings"],
+        scotland=results["scotland"],
+        areas=results["areas"],
+        active_areas=results["active_areas"],
+        stations=results["stations_with_levels"],
+        created=created,
+    )
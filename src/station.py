@@ -2,10 +2,23 @@
 and tools for manipulating station data
 """
 
+import numpy as np
+
 
 class MonitoringStation:
     """This class represents a river-level monitoring station"""
 
+    __slots__ = (
+        "station_id",
+        "measure_id",
+        "name",
+        "coord",
+        "typical_range",
+        "river",
+        "town",
+        "latest_level",
+    )
+
     def __init__(
         self, station_id, measure_id, label, coord, typical_range, river, town
     ):
@@ -76,3 +89,215 @@ def inconsistent_typical_range_stations(stations):
     ]
 
     return inconsistent_stations
+
+
+class StationView:
+    """This class represents one row of a StationTable, with the same
+    attributes and methods as MonitoringStation. It holds no data of its
+    own: attributes are read from the table, and setting latest_level
+    writes to the table.
+    """
+
+    __slots__ = ("table", "i")
+
+    def __init__(self, table, i):
+
+        self.table = table
+        self.i = i
+
+    @property
+    def station_id(self):
+        return self.table.station_ids[self.i]
+
+    @property
+    def measure_id(self):
+        return self.table.measure_ids[self.i]
+
+    @property
+    def name(self):
+        return self.table.names[self.i]
+
+    @property
+    def coord(self):
+        return (float(self.table.lat[self.i]), float(self.table.lon[self.i]))
+
+    @property
+    def typical_range(self):
+        low = self.table.typical_low[self.i]
+        high = self.table.typical_high[self.i]
+        if np.isnan(low) or np.isnan(high):
+            return None
+        return (float(low), float(high))
+
+    @property
+    def river(self):
+        return self.table.rivers[self.i]
+
+    @property
+    def town(self):
+        return self.table.towns[self.i]
+
+    @property
+    def latest_level(self):
+        level = self.table.latest_level[self.i]
+        return None if np.isnan(level) else float(level)
+
+    @latest_level.setter
+    def latest_level(self, value):
+        self.table.latest_level[self.i] = np.nan if value is None else value
+
+    # the MonitoringStation methods only use the attributes above
+    __repr__ = MonitoringStation.__repr__
+    typical_range_consistent = MonitoringStation.typical_range_consistent
+    relative_water_level = MonitoringStation.relative_water_level
+
+
+class StationTable:
+    """This class holds the whole monitoring network as a set of NumPy
+    arrays (one entry per station), so that level computations can be
+    done for every station at once rather than one station at a time.
+
+    Missing typical ranges and levels are stored as NaN.
+    """
+
+    def __init__(
+        self,
+        station_ids,
+        measure_ids,
+        names,
+        lat,
+        lon,
+        typical_low,
+        typical_high,
+        rivers,
+        towns,
+        latest_level=None,
+    ):
+
+        self.station_ids = np.asarray(station_ids, dtype=object)
+        self.measure_ids = np.asarray(measure_ids, dtype=object)
+        self.names = np.asarray(names, dtype=object)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.typical_low = np.asarray(typical_low, dtype=np.float64)
+        self.typical_high = np.asarray(typical_high, dtype=np.float64)
+        self.rivers = np.asarray(rivers, dtype=object)
+        self.towns = np.asarray(towns, dtype=object)
+
+        if latest_level is None:
+            latest_level = np.full(len(self.station_ids), np.nan)
+        self.latest_level = np.asarray(latest_level, dtype=np.float64)
+
+        # index from measure id to row, used when attaching levels
+        self.measure_index = {m: i for i, m in enumerate(self.measure_ids)}
+
+    @classmethod
+    def from_stations(cls, stations):
+        """Build a StationTable from a list of MonitoringStation objects"""
+
+        def value_or_nan(x):
+            return np.nan if x is None else x
+
+        typical = [s.typical_range or (np.nan, np.nan) for s in stations]
+
+        return cls(
+            station_ids=[s.station_id for s in stations],
+            measure_ids=[s.measure_id for s in stations],
+            names=[s.name for s in stations],
+            lat=[s.coord[0] for s in stations],
+            lon=[s.coord[1] for s in stations],
+            typical_low=[t[0] for t in typical],
+            typical_high=[t[1] for t in typical],
+            rivers=[s.river for s in stations],
+            towns=[s.town for s in stations],
+            latest_level=[value_or_nan(s.latest_level) for s in stations],
+        )
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def __repr__(self):
+        return "StationTable: {} stations, {} with levels".format(
+            len(self), int(np.count_nonzero(~np.isnan(self.latest_level)))
+        )
+
+    def station(self, i):
+        """Return row i as a StationView, which behaves like a
+        MonitoringStation but reads and writes the table
+        """
+        return StationView(self, i)
+
+    def stations(self, indices=None):
+        """Return a list of StationView objects for the given rows (all
+        rows by default)
+        """
+        if indices is None:
+            indices = range(len(self))
+
+        return [self.station(i) for i in indices]
+
+    def update_levels(self, measure_id_to_value):
+        """Attach latest readings from a {measure id: value} dictionary.
+        Measures not in the table, and non-float values, are ignored.
+        Returns the indices of the stations whose level changed.
+        """
+
+        rows = []
+        values = []
+        for measure_id, value in measure_id_to_value.items():
+            i = self.measure_index.get(measure_id)
+            if i is not None and isinstance(value, float):
+                rows.append(i)
+                values.append(value)
+
+        rows = np.asarray(rows, dtype=np.intp)
+        values = np.asarray(values, dtype=np.float64)
+
+        changed = rows[self.latest_level[rows] != values]
+        self.latest_level[rows] = values
+
+        return changed
+
+    def typical_range_consistent(self):
+        """Return a boolean array which is True for stations with a
+        consistent typical range (available, and low < high)
+        """
+        # comparisons with NaN are False, so missing ranges are inconsistent
+        return self.typical_low < self.typical_high
+
+    def relative_water_level(self, indices=None):
+        """Return an array of latest water levels as a fraction of the
+        typical range, for the given rows (all rows by default). Entries
+        are NaN where data is inconsistent or unavailable.
+        """
+        if indices is None:
+            indices = slice(None)
+
+        low = self.typical_low[indices]
+        high = self.typical_high[indices]
+        level = self.latest_level[indices]
+
+        # comparisons with NaN are False, so missing ranges are inconsistent
+        consistent = low < high
+
+        rel = np.full(len(low), np.nan)
+        rel[consistent] = (level[consistent] - low[consistent]) / (
+            high[consistent] - low[consistent]
+        )
+
+        return rel
+
+    def inconsistent_typical_range_stations(self):
+        """Return the indices of stations with inconsistent typical ranges"""
+        return np.flatnonzero(~self.typical_range_consistent())
+
+    def stations_level_over_threshold(self, tol):
+        """Return the indices of stations with a relative water level above
+        tol, sorted from highest to lowest relative level
+        """
+        rel = self.relative_water_level()
+
+        # NaN compares False, so stations without a level are excluded
+        over = np.flatnonzero(rel > tol)
+
+        return over[np.argsort(-rel[over], kind="stable")]
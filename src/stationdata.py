@@ -2,14 +2,19 @@
 from JSON objects fetched from the Environment Agency API
 """
 
-from .station import MonitoringStation
+from .station import MonitoringStation, StationTable
 from .datafetcher import fetch_station_data, fetch_latest_water_level_data
-from .utils import sorted_by_key
+from .datafetcher import fetch_water_level_readings_since
+from .utils import haversine_array, top_k
+from .instrument import count, timed
 import pandas as pd
+import numpy as np
 from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 from haversine import haversine
 
 
+@timed("build_station_list")
 def build_station_list(use_cache=True):
     """Build and return a list of all river level monitoring stations
     from data fetched from the EA. Each station is represented by a
@@ -39,7 +44,7 @@ def build_station_list(use_cache=True):
                 float(e["stageScale"]["typicalRangeLow"]),
                 float(e["stageScale"]["typicalRangeHigh"]),
             )
-        except:
+        except (KeyError, TypeError, ValueError):
             typical_range = None
 
         try:
@@ -58,16 +63,19 @@ def build_station_list(use_cache=True):
 
             stations.append(s)
 
-        except:
+        except (KeyError, IndexError, TypeError, ValueError):
             # not all data was available, so skip
-            pass
+            count("skipped_station")
 
     return stations
 
 
-def update_water_levels(stations):
+@timed("attach_water_levels")
+def update_water_levels(stations, history=None):
     """Attach water level data contained in 'data' (latest water levels)
     to MonitoringStation objects
+
+    If a LevelHistory is given the latest readings are also recorded in it.
     """
 
     # fetch level data
@@ -75,11 +83,21 @@ def update_water_levels(stations):
 
     # dictionary relating the measure id to the latest reading (value)
     measure_id_to_value = dict()
+    measure_id_to_time = dict()
     for measure in data["items"]:
         if "latestReading" in measure:
             latest_reading = measure["latestReading"]
             measure_id = latest_reading["measure"]
             measure_id_to_value[measure_id] = latest_reading["value"]
+            measure_id_to_time[measure_id] = latest_reading["dateTime"]
+
+    # keep a history of readings
+    if history is not None:
+        history.record(
+            list(measure_id_to_value),
+            list(measure_id_to_time.values()),
+            list(measure_id_to_value.values()),
+        )
 
     # attach the latest reading to station objects
     for station in stations:
@@ -95,6 +113,86 @@ def update_water_levels(stations):
             station.latest_level = measure_id_to_value[station.measure_id]
 
 
+@timed("refresh_water_levels", items=lambda r: len(r[0]))
+def refresh_water_levels(stations, since=None, history=None, lag=900.0):
+    """Incrementally update the latest water levels of MonitoringStation
+    objects.
+
+    Only readings taken since 'since' (an ISO 8601 date-time string, as
+    returned by the previous call) are fetched, and only stations with a
+    new level are updated - stations with no new reading keep their
+    current level. If 'since' is None all latest readings are fetched.
+
+    Returns a tuple (changed, since), where 'changed' is the list of
+    stations whose level changed and 'since' is the time to pass to the
+    next call. Stations report in delayed batches, so this is the oldest
+    of the newest readings of each measure seen, rather than the newest
+    reading overall, so a measure whose batch is behind the others still
+    gets its next readings. It is no earlier than 'lag' seconds before
+    this request, so a measure which has stopped reporting does not hold
+    every later refresh back. Readings fetched twice are ignored.
+    """
+
+    # earliest start of the next refresh, taken before fetching
+    earliest = (datetime.now(timezone.utc) - timedelta(seconds=lag)).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+
+    # dictionary relating the measure id to the newest (dateTime, value)
+    if since is None:
+        data = fetch_latest_water_level_data()
+        readings = [m["latestReading"] for m in data["items"] if "latestReading" in m]
+    else:
+        readings = fetch_water_level_readings_since(since)
+
+    measure_id_to_reading = dict()
+    for reading in readings:
+        measure_id = reading["measure"]
+        previous = measure_id_to_reading.get(measure_id)
+        # ISO 8601 strings in the same format sort chronologically
+        if previous is None or reading["dateTime"] > previous[0]:
+            measure_id_to_reading[measure_id] = (reading["dateTime"], reading["value"])
+
+    # start the next refresh from the measure which is furthest behind
+    newest = [t for t, _ in measure_id_to_reading.values()]
+    next_since = min(newest) if newest else since or earliest
+    next_since = max(next_since, earliest)
+
+    # keep a history of every reading, not just the newest
+    if history is not None:
+        history.record(
+            [r["measure"] for r in readings],
+            [r["dateTime"] for r in readings],
+            [r["value"] for r in readings],
+        )
+
+    # attach new readings, only touching stations which have changed
+    changed = []
+    for station in stations:
+        reading = measure_id_to_reading.get(station.measure_id)
+        if reading is None or not isinstance(reading[1], float):
+            continue
+
+        if station.latest_level != reading[1]:
+            station.latest_level = reading[1]
+            changed.append(station)
+
+    return changed, next_since
+
+
+@timed("build_station_table", items=len)
+def build_station_table(use_cache=True):
+    """Build a StationTable of all river level monitoring stations with
+    their latest water levels attached
+    """
+
+    stations = build_station_list(use_cache)
+    update_water_levels(stations)
+
+    return StationTable.from_stations(stations)
+
+
+@timed("build_station_database")
 def build_station_database():
     """Builds a dataframe containing monitoring station data.
     Each row is one MonitoringStation object.
@@ -164,17 +262,21 @@ def distance(p0, p1):
     return haversine(p0, p1)
 
 
-def stations_by_distance(stations, p):
+def stations_by_distance(stations, p, k=None):
     """Return list of (station, distance) tuples, where 'distance' is the
     distance from the coordinate p. The list is sorted by distance.
 
+    If k is given only the k nearest stations are returned, which avoids
+    sorting the whole list.
     """
 
-    # Build list of tuples (distance, station)
-    stations_by_dist = []
-    for station in stations:
-        d = distance(p, station.coord)
-        stations_by_dist.append((station, d))
+    # distances to all stations in one pass
+    d = haversine_array(p, [station.coord for station in stations])
+
+    if k is None:
+        ix = np.argsort(d, kind="stable")
+    else:
+        ix = top_k(d, k)
 
     # Return list sorted by distance
-    return sorted_by_key(stations_by_dist, 1)
+    return [(stations[i], float(d[i])) for i in ix]
@@ -0,0 +1,101 @@
+"""This module provides a spatial index over monitoring station
+coordinates, for fast batched nearest-station and within-radius queries.
+
+Coordinates are converted to points on the unit sphere and indexed with a
+KD-tree. Straight-line (chord) distance between points on a sphere
+increases with great-circle distance, so nearest neighbours in the tree are
+the nearest stations on the ground.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# mean Earth radius (km), as used by the haversine package
+earth_radius = 6371.0088
+
+
+def to_unit_vectors(coords):
+    """Convert an array of (lat, lon) coordinates in degrees to an (n, 3)
+    array of points on the unit sphere
+    """
+    coords = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    lat, lon = coords[:, 0], coords[:, 1]
+
+    return np.column_stack(
+        (np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat))
+    )
+
+
+def chord_to_km(chord):
+    """Convert a chord length on the unit sphere to great-circle km"""
+    return 2 * earth_radius * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+
+def km_to_chord(d):
+    """Convert a great-circle distance in km to a chord length on the
+    unit sphere
+    """
+    return 2 * np.sin(np.minimum(d / earth_radius, np.pi) / 2)
+
+
+class StationIndex:
+    """This class represents a spatial index over station coordinates.
+    Query results are row indices into the coordinates the index was
+    built from (e.g. rows of a StationTable or a list of stations).
+    """
+
+    def __init__(self, coords):
+
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.tree = cKDTree(to_unit_vectors(self.coords))
+
+    @classmethod
+    def from_stations(cls, stations):
+        """Build an index from a list of MonitoringStation objects"""
+        return cls([s.coord for s in stations])
+
+    @classmethod
+    def from_table(cls, table):
+        """Build an index from a StationTable"""
+        return cls(np.column_stack((table.lat, table.lon)))
+
+    def __len__(self):
+        return len(self.coords)
+
+    def nearest(self, points, k=1):
+        """Return the k nearest stations to each (lat, lon) query point.
+
+        Returns (distances, indices), each an array of shape (m, k) for m
+        query points, sorted by distance (in km). If there are fewer than k
+        stations, missing entries have infinite distance and index len(self).
+        """
+        chord, ix = self.tree.query(to_unit_vectors(points), k=k)
+
+        # cKDTree drops the last axis when k=1
+        chord = np.asarray(chord).reshape(-1, k)
+        ix = np.asarray(ix).reshape(-1, k)
+
+        # chord_to_km clips the infinite chord of missing entries to the
+        # antipode, so restore their infinite distance
+        d = chord_to_km(chord)
+        d[ix == len(self)] = np.inf
+
+        return d, ix
+
+    def within(self, points, r):
+        """Return the stations within r km of each (lat, lon) query point.
+
+        Returns a list (one entry per query point) of (distances, indices)
+        array pairs, sorted by distance.
+        """
+        xyz = to_unit_vectors(points)
+        hits = self.tree.query_ball_point(xyz, km_to_chord(r))
+
+        results = []
+        for p, ix in zip(xyz, hits):
+            ix = np.asarray(ix, dtype=np.intp)
+            d = chord_to_km(np.linalg.norm(self.tree.data[ix] - p, axis=1))
+            order = np.argsort(d, kind="stable")
+            results.append((d[order], ix[order]))
+
+        return results
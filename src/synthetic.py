@@ -0,0 +1,277 @@
+"""This module generates synthetic flood warning, station and polygon data
+in the same shape as the EA, NRW and SEPA payloads, at any scale. It is
+used for benchmarking, and for demos and testing when there are no live
+flood warnings.
+
+All generators take a 'seed' so the same payloads can be regenerated.
+"""
+
+import os
+import zipfile
+import tempfile
+import numpy as np
+import geopandas as gpd
+import shapely
+
+# extent of GB in British National Grid (easting, northing) metres
+gb_extent = (100000.0, 10000.0, 650000.0, 1200000.0)
+
+# rough extents of England, Wales and Scotland (lat, lon)
+england_extent = (50.0, -5.5, 55.5, 1.7)
+wales_extent = (51.4, -5.2, 53.4, -2.7)
+scotland_extent = (55.0, -6.5, 58.6, -1.8)
+
+ea_areas = ["Thames", "Yorkshire", "Wessex", "Devon and Cornwall", "East Anglia"]
+counties = ["Oxfordshire", "North Yorkshire", "Somerset", "Devon", "Norfolk"]
+rivers = ["River Thames", "River Ouse", "River Severn", "River Exe", "River Wensum"]
+
+
+def ea_code(i):
+    """Return a synthetic EA flood warning area code"""
+    return "061WAF{:06d}".format(i)
+
+
+def nrw_code(i):
+    """Return a synthetic NRW flood warning area code"""
+    return "WAF{:06d}".format(i)
+
+
+def sepa_code(i):
+    """Return a synthetic SEPA flood warning area id"""
+    return "SEPA{:06d}".format(i)
+
+
+def random_polygons(n, vertices=64, radius=(200.0, 2000.0), extent=gb_extent, seed=0):
+    """Return an array of n irregular (star-shaped) shapely Polygons with
+    the given number of vertices, scattered across 'extent' (in BNG metres)
+    """
+    rng = np.random.default_rng(seed)
+
+    centres = np.column_stack(
+        (
+            rng.uniform(extent[0], extent[2], n),
+            rng.uniform(extent[1], extent[3], n),
+        )
+    )
+    r = rng.uniform(radius[0], radius[1], (n, 1)) * rng.uniform(0.6, 1.0, (n, vertices))
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+
+    x = centres[:, [0]] + r * np.cos(angles)
+    y = centres[:, [1]] + r * np.sin(angles)
+
+    # close each ring by repeating the first vertex
+    coords = np.stack((x, y), axis=2)
+    coords = np.concatenate((coords, coords[:, :1]), axis=1)
+
+    return shapely.polygons(coords)
+
+
+def ea_flood_payload(n, seed=0):
+    """Return a synthetic EA 'id/floods' JSON payload with n warnings"""
+    rng = np.random.default_rng(seed)
+
+    items = []
+    for i in range(n):
+        k = int(rng.integers(len(ea_areas)))
+        time = "2024-07-{:02d}T{:02d}:{:02d}:00".format(
+            int(rng.integers(1, 29)), int(rng.integers(24)), int(rng.integers(60))
+        )
+        area = {"county": counties[k]}
+        # riverOrSea is not always present
+        if rng.random() < 0.9:
+            area["riverOrSea"] = rivers[k]
+
+        items.append(
+            {
+                "@id": "http://environment.data.gov.uk/flood-monitoring/id/floods/{}".format(
+                    ea_code(i)
+                ),
+                "description": "Synthetic warning area {}".format(i),
+                "message": "Flooding is expected. Immediate action required. " * 4,
+                "eaAreaName": ea_areas[k],
+                "floodAreaID": ea_code(i),
+                "severityLevel": int(rng.choice([1, 2], p=[0.1, 0.9])),
+                "floodArea": area,
+                "timeRaised": time,
+                "timeMessageChanged": time,
+                "timeSeverityChanged": time,
+            }
+        )
+
+    return {"items": items}
+
+
+def nrw_flood_payload(n, seed=0):
+    """Return a synthetic NRW flood warning payload with n warnings, as
+    returned by fetch_wales_data (a list of feature properties)
+    """
+    rng = np.random.default_rng(seed)
+
+    data = []
+    for i in range(n):
+        t = int(rng.integers(1719792000, 1722384000)) * 1000
+        data.append(
+            {
+                "DESCRIPTION": "Synthetic Welsh warning area {}".format(i),
+                "RIM_ENGLISH": "Flooding is expected. Immediate action required. " * 4,
+                "AREA": "South West",
+                "FWACODE": nrw_code(i),
+                "SEVERITYVALUE": int(rng.choice([1, 2], p=[0.1, 0.9])),
+                "TIDAL": "N",
+                "TIMERAISED": t,
+                "RIM_CHANGED": t,
+                "SEVERITY_CHANGED": t,
+            }
+        )
+
+    return data
+
+
+def sepa_payload(n, vertices=64, seed=0):
+    """Return a synthetic SEPA floodline payload with n areas, as returned
+    by fetch_scotland_data. Most areas are warnings, the rest alerts.
+    """
+    rng = np.random.default_rng(seed)
+    polys = random_polygons(n, vertices, seed=seed)
+
+    areas = []
+    for i, poly in enumerate(polys):
+        x, y = poly.exterior.xy
+        areas.append(
+            {
+                "id": sepa_code(i),
+                "name": "Synthetic Scottish area {}".format(i),
+                "x": ",".join("{:.1f}".format(v) for v in x),
+                "y": ",".join("{:.1f}".format(v) for v in y),
+                "mtype": "warning" if rng.random() < 0.8 else "alert",
+                "color": "#ff0000",
+                "fontColor": "#ffffff",
+                "borderColor": "#000000",
+                "click": "",
+                "iType": "1",
+            }
+        )
+
+    return {"floodwarningMap": {"areas": areas}}
+
+
+def station_payload(n, seed=0):
+    """Return a synthetic EA 'id/stations' JSON payload with n stations.
+    As with the live data, some stations lack a town, river or typical
+    range.
+    """
+    rng = np.random.default_rng(seed)
+
+    lat = rng.uniform(england_extent[0], england_extent[2], n)
+    lon = rng.uniform(england_extent[1], england_extent[3], n)
+    low = rng.uniform(0.0, 1.0, n)
+    high = low + rng.uniform(0.2, 3.0, n)
+
+    items = []
+    for i in range(n):
+        station_id = "http://environment.data.gov.uk/flood-monitoring/id/stations/S{:06d}".format(i)
+        e = {
+            "@id": station_id,
+            "label": "Synthetic station {}".format(i),
+            "lat": float(lat[i]),
+            "long": float(lon[i]),
+            "measures": [{"@id": "{}-level-stage-i-15_min-m".format(station_id)}],
+        }
+        if rng.random() < 0.9:
+            e["town"] = "Town {}".format(i % 500)
+        if rng.random() < 0.9:
+            e["riverName"] = rivers[i % len(rivers)]
+        if rng.random() < 0.95:
+            e["stageScale"] = {
+                "typicalRangeLow": float(low[i]),
+                "typicalRangeHigh": float(high[i]),
+            }
+        items.append(e)
+
+    return {"items": items}
+
+
+def water_level_payload(stations, seed=0, time="2024-07-12T10:30:00Z"):
+    """Return a synthetic EA 'id/measures' latest reading payload for the
+    measures in a station payload
+    """
+    rng = np.random.default_rng(seed)
+
+    items = []
+    for e in stations["items"]:
+        measure_id = e["measures"][-1]["@id"]
+        # a small number of measures have no latest reading
+        if rng.random() < 0.05:
+            items.append({"@id": measure_id})
+            continue
+
+        items.append(
+            {
+                "@id": measure_id,
+                "latestReading": {
+                    "measure": measure_id,
+                    "dateTime": time,
+                    "value": float(rng.uniform(0.0, 4.0)),
+                },
+            }
+        )
+
+    return {"items": items}
+
+
+def fwa_geodataframe(codes, vertices=64, seed=0):
+    """Return a GeoDataFrame of flood warning area polygons with the given
+    area codes, in the column layout of the EA shapefiles
+    """
+    n = len(codes)
+    return gpd.GeoDataFrame(
+        {
+            "AREA": ["Synthetic"] * n,
+            "FWS_TACODE": list(codes),
+            "TA_NAME": ["Area {}".format(c) for c in codes],
+            "DESCRIP": ["Synthetic warning area {}".format(c) for c in codes],
+            "LA_NAME": ["Synthetic"] * n,
+            "QDIAL": ["000000"] * n,
+            "RIVER_SEA": ["River"] * n,
+            "PARENT": ["061FAG000"] * n,
+        },
+        geometry=random_polygons(n, vertices, seed=seed),
+        crs="EPSG:27700",
+    )
+
+
+def write_zipped_shapefile(gdf, zip_path, shp_name):
+    """Write a GeoDataFrame as a shapefile 'shp_name' inside a zip archive,
+    as read by the loaders in polygons.py
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        gdf.to_file(os.path.join(tmp, shp_name))
+
+        with zipfile.ZipFile(zip_path, "w") as z:
+            for f in os.listdir(tmp):
+                z.write(os.path.join(tmp, f), f)
+
+
+def write_polygon_data(root, n_ea, n_nrw, vertices=64, seed=0):
+    """Write synthetic English and Welsh flood alert and warning area
+    shapefiles under root/data, matching the paths used in polygons.py.
+    Warning area codes match those in ea_flood_payload and
+    nrw_flood_payload.
+    """
+    data_dir = os.path.join(root, "data")
+    os.makedirs(data_dir, exist_ok=True)
+
+    ea = fwa_geodataframe([ea_code(i) for i in range(n_ea)], vertices, seed)
+    nrw = fwa_geodataframe([nrw_code(i) for i in range(n_nrw)], vertices, seed + 1)
+    nrw["W_REGION"] = "De Orllewin"
+
+    for gdf, name in [
+        (ea, "Flood_Warning_Areas"),
+        (ea, "Flood_Alert_Areas"),
+    ]:
+        write_zipped_shapefile(
+            gdf, os.path.join(data_dir, name + ".zip"), name + "Polygon.shp"
+        )
+
+    for gdf, name in [(nrw, "NRW_FLOOD_WARNING"), (nrw, "NRW_FLOOD_ALERT")]:
+        write_zipped_shapefile(gdf, os.path.join(data_dir, name + ".zip"), name + ".shp")
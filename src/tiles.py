@@ -0,0 +1,239 @@
+"""This module provides functionality for exporting active flood warning
+areas as Mapbox Vector Tiles in a local MBTiles archive, so dashboards can
+fetch only the tiles in view rather than the whole national dataset.
+
+Regeneration is incremental: the archive records a hash and extent of each
+warning area it contains, and on subsequent exports only the tiles touching
+areas that were added, removed or changed are re-encoded.
+"""
+
+import os
+import gzip
+import json
+import math
+import sqlite3
+import hashlib
+import mapbox_vector_tile
+import shapely
+from shapely import box, clip_by_rect
+
+sub_dir = "tiles"
+
+layer_name = "flood_warnings"
+
+# CRS of the tiles, Web Mercator (pass areas already in it to skip reprojecting)
+tile_crs = "EPSG:3857"
+
+# properties of each warning area that are written into the tiles
+tile_cols = ["FWS_TACODE", "severity", "description", "message"]
+
+# vector tile extent, and the buffer (in tile units) clipped around each tile
+# so polygons edges are not drawn at tile boundaries
+extent = 4096
+buffer = 64
+
+# half the width of the Web Mercator world (in metres)
+half_world = 20037508.342789244
+
+
+def tile_bounds(z, x, y):
+    """Return the Web Mercator bounds (minx, miny, maxx, maxy) of the XYZ
+    tile z/x/y
+    """
+    size = 2 * half_world / 2**z
+    minx = -half_world + x * size
+    maxy = half_world - y * size
+
+    return (minx, maxy - size, minx + size, maxy)
+
+
+def tiles_covering(bounds, z):
+    """Return a list of (x, y) XYZ tile indices at zoom z that intersect
+    the Web Mercator bounds (minx, miny, maxx, maxy)
+    """
+    n = 2**z
+    size = 2 * half_world / n
+
+    def clamp(i):
+        return min(max(i, 0), n - 1)
+
+    x0 = clamp(int(math.floor((bounds[0] + half_world) / size)))
+    x1 = clamp(int(math.floor((bounds[2] + half_world) / size)))
+    y0 = clamp(int(math.floor((half_world - bounds[3]) / size)))
+    y1 = clamp(int(math.floor((half_world - bounds[1]) / size)))
+
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def feature_hash(row):
+    """Return a digest of the tiled properties and geometry of one warning area"""
+    h = hashlib.sha256()
+    for c in tile_cols:
+        h.update(str(row[c]).encode("utf-8"))
+        h.update(b"\x1f")
+    h.update(shapely.to_wkb(row.geometry))
+
+    return h.hexdigest()[:16]
+
+
+def open_mbtiles(filename):
+    """Open (creating if necessary) an MBTiles archive and return the
+    connection
+    """
+    conn = sqlite3.connect(filename)
+    conn.execute("CREATE TABLE IF NOT EXISTS metadata (name text, value text)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS name ON metadata (name)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS tiles "
+        "(zoom_level integer, tile_column integer, tile_row integer, tile_data blob)"
+    )
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS tile_index "
+        "ON tiles (zoom_level, tile_column, tile_row)"
+    )
+
+    return conn
+
+
+def read_metadata(conn, name):
+    """Return a metadata value from an MBTiles archive, or None"""
+    row = conn.execute("SELECT value FROM metadata WHERE name = ?", (name,)).fetchone()
+
+    return row[0] if row else None
+
+
+def encode_tile(data, z, x, y):
+    """Encode the warning areas in 'data' (in Web Mercator) that intersect
+    tile z/x/y. Returns gzipped tile bytes, or None if the tile is empty.
+    """
+    bounds = tile_bounds(z, x, y)
+    pad = (bounds[2] - bounds[0]) * buffer / extent
+    clip = (bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad)
+
+    features = []
+    for i in data.sindex.query(box(*clip), predicate="intersects"):
+        row = data.iloc[i]
+        # clip to the tile and simplify to the tile resolution
+        geom = clip_by_rect(row.geometry, *clip).simplify(pad / buffer)
+        if geom.is_empty:
+            continue
+
+        properties = {}
+        for c in tile_cols:
+            value = row[c]
+            # skip missing values, and convert numpy scalars to python types
+            if value is None or value != value:
+                continue
+            properties[c] = value.item() if hasattr(value, "item") else value
+
+        features.append({"geometry": geom, "properties": properties})
+
+    if not features:
+        return None
+
+    tile = mapbox_vector_tile.encode(
+        [{"name": layer_name, "features": features}],
+        default_options={"quantize_bounds": bounds, "extents": extent},
+    )
+
+    return gzip.compress(tile)
+
+
+def export_tiles(warnings, fwas, minzoom=5, maxzoom=12, filename=None, full=False):
+    """Export active flood warnings, joined to their flood warning areas,
+    as vector tiles into an MBTiles archive.
+
+    If the archive already exists only tiles touching warning areas that
+    have changed since the previous export are regenerated, unless 'full'
+    is True. Returns the path to the archive and the number of tiles written.
+    """
+
+    if filename is None:
+        os.makedirs(sub_dir, exist_ok=True)
+        filename = os.path.join(sub_dir, "{}.mbtiles".format(layer_name))
+
+    # join warnings to their polygons and reproject to Web Mercator
+    active_fwas = fwas.merge(warnings, on="FWS_TACODE", how="inner")
+    data = active_fwas[tile_cols + [active_fwas.geometry.name]]
+    if data.crs != tile_crs:
+        data = data.to_crs(tile_crs)
+    data = data.reset_index(drop=True)
+
+    conn = open_mbtiles(filename)
+
+    # state of the previous export, {FWS_TACODE: [hash, bounds]}
+    old_state = read_metadata(conn, "warning_state")
+    stored_zooms = (read_metadata(conn, "minzoom"), read_metadata(conn, "maxzoom"))
+    if old_state is None or stored_zooms != (str(minzoom), str(maxzoom)):
+        full = True
+    old_state = {} if full else json.loads(old_state)
+
+    new_state = {}
+    for _, row in data.iterrows():
+        new_state[row.FWS_TACODE] = [feature_hash(row), list(row.geometry.bounds)]
+
+    # extents of areas which were added, removed or changed
+    changed = [
+        state[1]
+        for code in set(old_state) | set(new_state)
+        if old_state.get(code, [None])[0] != new_state.get(code, [None])[0]
+        for state in (old_state.get(code), new_state.get(code))
+        if state is not None
+    ]
+
+    if full:
+        conn.execute("DELETE FROM tiles")
+
+    written = 0
+    for z in range(minzoom, maxzoom + 1):
+        dirty = set()
+        for bounds in changed:
+            dirty.update(tiles_covering(bounds, z))
+
+        for x, y in dirty:
+            tile = encode_tile(data, z, x, y)
+
+            # MBTiles uses TMS tile rows (origin bottom left)
+            tile_row = 2**z - 1 - y
+            if tile is None:
+                conn.execute(
+                    "DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                    (z, x, tile_row),
+                )
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)",
+                    (z, x, tile_row, tile),
+                )
+                written += 1
+
+    metadata = {
+        "name": layer_name,
+        "format": "pbf",
+        "type": "overlay",
+        "minzoom": str(minzoom),
+        "maxzoom": str(maxzoom),
+        "bounds": "-8.65,49.86,1.77,60.86",
+        "json": json.dumps(
+            {
+                "vector_layers": [
+                    {
+                        "id": layer_name,
+                        "fields": {
+                            c: "Number" if c == "severity" else "String"
+                            for c in tile_cols
+                        },
+                        "minzoom": minzoom,
+                        "maxzoom": maxzoom,
+                    }
+                ]
+            }
+        ),
+        "warning_state": json.dumps(new_state),
+    }
+    conn.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)", metadata.items())
+
+    conn.commit()
+    conn.close()
+
+    return filename, written
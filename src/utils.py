@@ -1,4 +1,8 @@
-""" This contains utility functions required by stationdata"""
+""" This contains utility functions used across the package"""
+
+import hashlib
+import numpy as np
+
 
 def sorted_by_key(x, i, reverse=False):
     """For a list of lists/tuples, return list sorted by the ith component
@@ -18,4 +22,54 @@ def sorted_by_key(x, i, reverse=False):
     def key(element):
         return element[i]
     
-    return sorted(x, key=key, reverse=reverse)
\ No newline at end of file
+    return sorted(x, key=key, reverse=reverse)
+
+def snapshot_hash(db, columns):
+    """Return a short hex digest identifying the contents of the given
+    columns of a dataframe of flood warnings.
+
+    Rows are sorted first, so the same set of warnings always gives the
+    same hash regardless of the order they were fetched in.
+    """
+
+    rows = sorted(
+        tuple(str(v) for v in row)
+        for row in db[[c for c in columns if c in db.columns]].itertuples(index=False)
+    )
+
+    h = hashlib.sha256()
+    for row in rows:
+        h.update("\x1f".join(row).encode("utf-8"))
+        h.update(b"\x1e")
+
+    return h.hexdigest()[:16]
+
+
+def haversine_array(p, coords, radius=6371.0088):
+    """Return an array of great-circle distances (in km) from the (lat, lon)
+    coordinate p to each (lat, lon) row of coords
+    """
+
+    coords = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    lat0, lon0 = np.radians(p[0]), np.radians(p[1])
+
+    dlat = coords[:, 0] - lat0
+    dlon = coords[:, 1] - lon0
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat0) * np.cos(coords[:, 0]) * np.sin(dlon / 2) ** 2
+
+    return 2 * radius * np.arcsin(np.sqrt(a))
+
+
+def top_k(values, k):
+    """Return the indices of the k smallest entries of values, in ascending
+    order. Uses a partial sort, so is cheaper than sorting everything when
+    k is small.
+    """
+
+    values = np.asarray(values)
+    if k < len(values):
+        ix = np.argpartition(values, k)[:k]
+    else:
+        ix = np.arange(len(values))
+
+    return ix[np.argsort(values[ix], kind="stable")]
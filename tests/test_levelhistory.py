@@ -0,0 +1,57 @@
+import numpy as np
+
+from src.levelhistory import LevelHistory
+
+
+def time(hour):
+    return "2024-01-01T{:02d}:00:00Z".format(hour)
+
+
+def test_record_same_batch_twice():
+    h = LevelHistory(["a", "b"], capacity=4)
+    batch = (["a", "b", "a"], [time(1), time(1), time(2)], [1.0, 5.0, 2.0])
+
+    assert h.record(*batch) == 3
+    assert h.record(*batch) == 0
+
+    _, values = h.chronological()
+    np.testing.assert_array_equal(values[0], [np.nan, np.nan, 1.0, 2.0])
+    np.testing.assert_array_equal(values[1], [np.nan, np.nan, np.nan, 5.0])
+
+
+def test_record_older_batch_ignored():
+    h = LevelHistory(["a"], capacity=4)
+    h.record(["a"], [time(5)], [5.0])
+
+    assert h.record(["a", "a"], [time(3), time(4)], [3.0, 4.0]) == 0
+    _, values = h.chronological()
+    np.testing.assert_array_equal(values[0], [np.nan, np.nan, np.nan, 5.0])
+
+
+def test_record_unordered_and_repeated_readings():
+    h = LevelHistory(["a", "b"], capacity=4)
+
+    n = h.record(
+        ["a", "a", "b", "a", "a", "unknown"],
+        [time(12), time(10), time(10), time(11), time(10), time(1)],
+        [2.0, 0.0, 5.0, 1.0, 0.0, 9.0],
+    )
+
+    assert n == 4
+    _, values = h.chronological()
+    np.testing.assert_array_equal(values[0], [np.nan, 0.0, 1.0, 2.0])
+    np.testing.assert_array_equal(h.head, [3, 1])
+
+
+def test_record_wraps_and_keeps_newest():
+    h = LevelHistory(["a"], capacity=4)
+    h.record(["a", "a", "a"], [time(1), time(2), time(3)], [1.0, 2.0, 3.0])
+
+    # more new readings than the buffer holds: only the newest are kept
+    n = h.record(["a"] * 6, [time(k) for k in range(4, 10)], [float(k) for k in range(4, 10)])
+
+    assert n == 4
+    times, values = h.chronological()
+    np.testing.assert_array_equal(values[0], [6.0, 7.0, 8.0, 9.0])
+    assert np.all(np.diff(times[0]) > 0)
+    assert h.head[0] == 3